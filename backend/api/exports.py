@@ -0,0 +1,153 @@
+import csv
+import json
+from itertools import chain, islice
+
+from django.core.cache import caches
+from django.http import (
+    HttpResponse, HttpResponseNotModified, StreamingHttpResponse,
+)
+from django.utils.http import parse_etags
+
+from recipes.models import Ingredient, ShoppingCart, ShoppingListItem
+from recipes.versions import get_table_version
+
+# Количество строк списка покупок в одном куске ответа.
+EXPORT_CHUNK_ROWS = 500
+
+
+def shopping_list(user):
+    """
+    To read user's shopping list from the materialized aggregate.
+    Rows: (name, measurement_unit, amount), ordered by name.
+    """
+    return ShoppingListItem.objects.filter(
+        user=user
+    ).values_list(
+        'ingredient__name',
+        'ingredient__measurement_unit',
+        'total_amount',
+    ).order_by('ingredient__name')
+
+
+def shopping_list_version(user):
+    """To get version of user's shopping cart, 0 if there is no cart."""
+    return ShoppingCart.objects.filter(
+        user=user
+    ).values_list('version', flat=True).first() or 0
+
+
+class Echo:
+    """Pseudo-buffer for csv.writer, returns written line."""
+
+    def write(self, value):
+        return value
+
+
+def txt_lines(rows):
+    yield 'Список покупок:'
+    for name, measurement_unit, amount in rows:
+        yield f'\n{name}: {amount} {measurement_unit}'
+
+
+def csv_lines(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def json_lines(rows):
+    yield '['
+    separator = ''
+    for name, measurement_unit, amount in rows:
+        yield separator + json.dumps(
+            {
+                'name': name,
+                'measurement_unit': measurement_unit,
+                'amount': amount,
+            },
+            ensure_ascii=False
+        )
+        separator = ',\n'
+    yield ']'
+
+
+EXPORT_FORMATS = {
+    'txt': txt_lines,
+    'csv': csv_lines,
+    'json': json_lines,
+}
+
+
+def chunked(lines):
+    """To join lines into encoded chunks of EXPORT_CHUNK_ROWS lines."""
+    lines = iter(lines)
+    while True:
+        chunk = ''.join(islice(lines, EXPORT_CHUNK_ROWS))
+        if not chunk:
+            return
+        yield chunk.encode()
+
+
+def export_response(rows, export_format, content_type, filename):
+    """
+    To stream rows in export_format. If the whole export fits into
+    one chunk, a plain response with 'Content-Length' is returned.
+    """
+    chunks = chunked(EXPORT_FORMATS[export_format](rows))
+    first = next(chunks, b'')
+    second = next(chunks, None)
+    if second is None:
+        response = HttpResponse(first, content_type=content_type)
+        response['Content-Length'] = len(first)
+    else:
+        response = StreamingHttpResponse(
+            chain((first, second), chunks),
+            content_type=content_type
+        )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{filename}.{export_format}"'
+    )
+    return response
+
+
+def shopping_list_response(request, export_format, content_type):
+    """
+    To export user's shopping list. Exports are cached in 'exports'
+    cache by (user, cart version, ingredients version, format), 'ETag'
+    is derived from the same key and 'If-None-Match' is answered
+    with 304.
+    """
+    user = request.user
+    # Названия и единицы измерения берутся из таблицы ингредиентов,
+    # поэтому ее версия тоже входит в ключ.
+    key = (
+        f'shopping_list:{user.id}:{shopping_list_version(user)}:'
+        f'{get_table_version(Ingredient)}:{export_format}'
+    )
+    etag = f'"{key}"'
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    cache = caches['exports']
+    body = cache.get(key)
+    if body is not None:
+        response = HttpResponse(body, content_type=content_type)
+        response['Content-Length'] = len(body)
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_list.{export_format}"'
+        )
+    else:
+        response = export_response(
+            shopping_list(user).iterator(),
+            export_format,
+            content_type,
+            'shopping_list'
+        )
+        # Кешируются только экспорты, поместившиеся в один кусок.
+        if not response.streaming:
+            cache.set(key, response.content)
+    response['ETag'] = etag
+    return response
@@ -1,22 +1,233 @@
-import base64
+import binascii
+import uuid
+from base64 import b64decode
+from tempfile import SpooledTemporaryFile
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image
 from rest_framework import serializers
 
+from recipes.models import ImageUpload
+from recipes.renditions import RENDITION_FORMATS, renditions
+
+
+# Допустимые типы изображений: MIME-тип -> (формат Pillow, расширение).
+IMAGE_TYPES = {
+    'image/jpeg': ('JPEG', 'jpg'),
+    'image/png': ('PNG', 'png'),
+    'image/gif': ('GIF', 'gif'),
+    'image/webp': ('WEBP', 'webp'),
+}
+
+# Размер порции base64 при декодировании, кратен 4.
+BASE64_CHUNK_SIZE = 64 * 1024
+
+# Изображения больше этого размера декодируются во временный файл
+# на диске, а не в память.
+SPOOL_MAX_SIZE = 4 * BASE64_CHUNK_SIZE
+
+BASE64_MARKER = ';base64,'
+
+
+def is_valid_image(file, pillow_format):
+    """
+    To check with Pillow that file is an image of pillow_format.
+    verify() checks the file structure without decoding pixels.
+    """
+    file.seek(0)
+    try:
+        image = Image.open(file)
+        image.verify()
+    except Exception:
+        return False
+    finally:
+        file.seek(0)
+    return image.format == pillow_format
+
 
 class Base64ImageField(serializers.ImageField):
     """
     To customize field 'image', which is used by
     serializer related to :model:'recipes.Recipe'.
+    Accepts 'data:image/<type>;base64,<data>' strings, tokens of
+    completed :model:'recipes.ImageUpload' and multipart files.
+    Base64 data is decoded by chunks into a spooled temporary file
+    and verified by Pillow without decoding the bitmap.
     """
 
+    default_error_messages = {
+        'invalid_data_url': (
+            'Ожидается изображение в формате '
+            'data:image/<тип>;base64,<данные>.'
+        ),
+        'unsupported_type': 'Неподдерживаемый тип изображения: {mime_type}.',
+        'too_large': 'Размер изображения превышает {max_size} байт.',
+        'invalid_base64': 'Данные изображения не в формате base64.',
+        'invalid_upload': 'Загрузка {token} не найдена или не завершена.',
+    }
+
     def to_internal_value(self, data):
-        if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(
-                base64.b64decode(imgstr),
-                name='temp.' + ext
-            )
+        if isinstance(data, str) and data.startswith('data:'):
+            return self.decode_data_url(data)
+        if isinstance(data, str):
+            try:
+                token = uuid.UUID(data)
+            except ValueError:
+                token = None
+            if token is not None:
+                return self.open_upload(token)
+        file = super().to_internal_value(data)
+        if file.size > settings.IMAGE_UPLOAD_MAX_SIZE:
+            self.fail('too_large', max_size=settings.IMAGE_UPLOAD_MAX_SIZE)
+        # Тип определен Django по содержимому файла.
+        if file.content_type not in IMAGE_TYPES:
+            self.fail('unsupported_type', mime_type=file.content_type)
+        return file
+
+    def open_upload(self, token):
+        upload = ImageUpload.objects.filter(
+            token=token,
+            user=self.context['request'].user
+        ).first()
+        if upload is None or not upload.completed:
+            self.fail('invalid_upload', token=token)
+        _, extension = IMAGE_TYPES[upload.content_type]
+        # Файл загрузки открывается только при сохранении рецепта:
+        # ошибка в других полях не оставит открытый дескриптор.
+        file = UploadedFile(
+            name=f'{token.hex}.{extension}',
+            content_type=upload.content_type,
+            size=upload.size
+        )
+        file.upload = upload
+        return file
+
+    def decode_data_url(self, data):
+        mime_type, start = self.parse_header(data)
+        pillow_format, extension = IMAGE_TYPES[mime_type]
+        file = self.decode_to_file(data, start)
+        try:
+            size = file.tell()
+            if not size:
+                self.fail('empty')
+            if not is_valid_image(file, pillow_format):
+                self.fail('invalid_image')
+        except serializers.ValidationError:
+            file.close()
+            raise
+        return UploadedFile(
+            file=file,
+            name=f'{uuid.uuid4().hex}.{extension}',
+            content_type=mime_type,
+            size=size
+        )
+
+    def parse_header(self, data):
+        """
+        To check MIME type and encoded size of the data URL.
+        Returns MIME type and offset of base64 data.
+        """
+        start = data.find(BASE64_MARKER, 0, 100)
+        if start == -1:
+            self.fail('invalid_data_url')
+        mime_type = data[len('data:'):start].lower()
+        if mime_type not in IMAGE_TYPES:
+            self.fail('unsupported_type', mime_type=mime_type)
+        start += len(BASE64_MARKER)
+
+        # Оценка сверху с учетом переносов строк через 76 символов,
+        # точный размер проверяется при декодировании.
+        max_size = settings.IMAGE_UPLOAD_MAX_SIZE
+        max_encoded = (max_size + 2) // 3 * 4
+        if len(data) - start > max_encoded + max_encoded // 76 * 2:
+            self.fail('too_large', max_size=max_size)
+        return mime_type, start
+
+    def decode_to_file(self, data, start):
+        # Строка не разбивается и не копируется целиком:
+        # base64 читается срезами по BASE64_CHUNK_SIZE символов.
+        # Пробельные символы (переносы строк base64 по RFC 2045)
+        # удаляются, декодируется часть среза, кратная 4 символам,
+        # остаток переносится в следующий срез.
+        max_size = settings.IMAGE_UPLOAD_MAX_SIZE
+        file = SpooledTemporaryFile(
+            max_size=SPOOL_MAX_SIZE,
+            dir=settings.FILE_UPLOAD_TEMP_DIR
+        )
+        pending = ''
+        padded = False
+        try:
+            for offset in range(start, len(data), BASE64_CHUNK_SIZE):
+                pending += ''.join(
+                    data[offset:offset + BASE64_CHUNK_SIZE].split()
+                )
+                end = len(pending) - len(pending) % 4
+                part, pending = pending[:end], pending[end:]
+                # Дополнение '=' допустимо только в конце данных.
+                if padded and part:
+                    raise binascii.Error('Excess data after padding')
+                padded = part.endswith('=')
+                file.write(b64decode(part, validate=True))
+                if file.tell() > max_size:
+                    file.close()
+                    self.fail('too_large', max_size=max_size)
+            # Неполная четверка символов в конце - ошибка дополнения.
+            file.write(b64decode(pending, validate=True))
+        except (binascii.Error, ValueError):
+            file.close()
+            self.fail('invalid_base64')
+        return file
 
-        return super().to_internal_value(data)
+
+class RenditionField(serializers.Field):
+    """
+    Read-only base field to present renditions of
+    :model:'recipes.Recipe' image by absolute urls.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def build_url(self, recipe, name):
+        url = recipe.image.storage.url(name)
+        request = self.context.get('request')
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+
+class ImageThumbField(RenditionField):
+    """
+    To present the narrowest JPEG rendition of recipe image.
+    The original image is presented until renditions are made.
+    """
+
+    def to_representation(self, recipe):
+        if not recipe.image:
+            return None
+        thumbs = renditions(recipe, 'jpg')
+        return self.build_url(
+            recipe,
+            thumbs[0][1] if thumbs else recipe.image.name
+        )
+
+
+class ImageSrcsetField(RenditionField):
+    """
+    To present 'srcset' of recipe image renditions for every format:
+    {"jpg": "<url> 300w, <url> 600w", "webp": ...}.
+    Null until renditions are made.
+    """
+
+    def to_representation(self, recipe):
+        srcset = {
+            extension: ', '.join(
+                f'{self.build_url(recipe, name)} {width}w'
+                for width, name in renditions(recipe, extension)
+            )
+            for extension in RENDITION_FORMATS
+        }
+        return srcset if all(srcset.values()) else None
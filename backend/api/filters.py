@@ -1,88 +1,96 @@
 # Здесь приводятся фильтры queryset Recipe.objects.all()
 # по query_params. Наследуем от BaseFilterBackend.
+from django.conf import settings
 from rest_framework import filters
 from rest_framework.exceptions import ValidationError
 
-from users.models import User
+from recipes.models import Favorite, Recipe, ShoppingCart
+from .ingredient_index import ingredient_index
 
 
-class SpecificAuthorFilterBackend(filters.BaseFilterBackend):
+class RecipeFilterBackend(filters.BaseFilterBackend):
     """
-    To filter queryset with 'author' field related to
-    :model:'recipes.Recipe' instance.
+    To filter queryset of :model:'recipes.Recipe' against
+    'author', 'is_favorited', 'is_in_shopping_cart' and 'tags'
+    query params. Each param becomes an IN-subquery over
+    recipe ids, so the result needs no DISTINCT.
+    Params are validated without queries to the database.
     """
 
-    def filter_queryset(self, request, queryset, view):
-        author = request.query_params.get('author')
-        if author is None:
-            return queryset
-        elif not User.objects.filter(id=int(author)).exists():
-            raise ValidationError(
-                'Введите корректный id автора.'
-            )
-        return queryset.filter(author=int(author))
-
-
-class IsFavouritedFilterBackend(filters.BaseFilterBackend):
-    """
-    To filter queryset with 'is_favorited' field related to
-    :model:'recipes.Favorite'. Expected values: 0 or 1.
-    """
+    boolean_values = ('0', '1')
 
     def filter_queryset(self, request, queryset, view):
-        is_favorited = request.query_params.get('is_favorited')
-        if (
-            is_favorited is None
-            or request.user.is_anonymous
-            or int(is_favorited) == 0
-        ):
+        # Фильтры применяются только к списку рецептов.
+        if view.detail:
             return queryset
-        return queryset.filter(favourite__user=request.user)
-
-
-class IsInShoppingCartFilterBackend(filters.BaseFilterBackend):
-    """
-    To filter queryset with 'is_in_shopping_cart' field related to
-    :model:'recipes.ShoppingCart'. Expected values: 0 or 1.
-    """
-
-    def filter_queryset(self, request, queryset, view):
-        is_in_shopping_cart = request.query_params.get(
-            'is_in_shopping_cart'
-        )
-        if (
-            is_in_shopping_cart is None
-            or request.user.is_anonymous
-            or int(is_in_shopping_cart) == 0
-        ):
+        params = self.get_params(request)
+        user = request.user
+
+        if params['author'] is not None:
+            queryset = queryset.filter(author_id=params['author'])
+        if params['tags']:
+            queryset = queryset.filter(
+                pk__in=Recipe.tags.through.objects.filter(
+                    tag__slug__in=params['tags']
+                ).values('recipe_id')
+            )
+        if user.is_anonymous:
             return queryset
-        return queryset.filter(recipes__user=request.user)
+        if params['is_favorited']:
+            queryset = queryset.filter(
+                pk__in=Favorite.objects.filter(
+                    user=user
+                ).values('recipe_id')
+            )
+        if params['is_in_shopping_cart']:
+            queryset = queryset.filter(
+                pk__in=ShoppingCart.recipe.through.objects.filter(
+                    shoppingcart__user=user
+                ).values('recipe_id')
+            )
+        return queryset
 
+    def get_params(self, request):
+        query_params = request.query_params
+        errors = {}
+        params = {
+            'author': None,
+            'tags': query_params.getlist('tags'),
+        }
 
-class TagsFilterBackend(filters.BaseFilterBackend):
-    """
-    To filter queryset with 'tags' field related to
-    :model:'recipes.Tag'.
-    """
+        author = query_params.get('author')
+        if author is not None:
+            try:
+                params['author'] = int(author)
+            except ValueError:
+                errors['author'] = 'Введите корректный id автора.'
 
-    def filter_queryset(self, request, queryset, view):
-        tags = request.query_params.getlist('tags')
+        for name in ('is_favorited', 'is_in_shopping_cart'):
+            value = query_params.get(name)
+            if value is not None and value not in self.boolean_values:
+                errors[name] = 'Допустимые значения: 0 или 1.'
+            params[name] = value == '1'
 
-        if not tags:
-            return queryset
-        if view.detail is False:
-            return queryset.filter(tags__slug__in=tags).distinct()
-        return queryset
+        if errors:
+            raise ValidationError(errors)
+        return params
 
 
 class IngredientNameFilter(filters.BaseFilterBackend):
     """
     To search through 'name' field related to
-    :model:'recipes.Ingredients'.
+    :model:'recipes.Ingredients'. Lookups are served from
+    the in-memory IngredientPrefixIndex or, with
+    INGREDIENT_SEARCH_BACKEND = 'database', by the database.
     """
 
     def filter_queryset(self, request, queryset, view):
-        name = request.query_params.get('name').lower()
-        return queryset.filter(
-            name__startswith=name
+        name = request.query_params.get('name')
+        if not name or view.detail:
+            return queryset
+        if settings.INGREDIENT_SEARCH_BACKEND == 'database':
+            return queryset.search(name, settings.INGREDIENT_SEARCH_LIMIT)
+        return ingredient_index.search(
+            name,
+            settings.INGREDIENT_SEARCH_LIMIT
         )
@@ -0,0 +1,65 @@
+from bisect import bisect_left
+from threading import Lock
+
+from recipes.models import Ingredient
+from recipes.versions import get_table_version
+
+
+class IngredientPrefixIndex:
+    """
+    In-memory index of :model:'recipes.Ingredient' names for
+    autocomplete. Names are case-folded and kept in a sorted array,
+    so a prefix lookup is a binary search. The index is rebuilt
+    when the version of the ingredient table changes.
+    """
+
+    def __init__(self):
+        self.version = None
+        # Ключи и ингредиенты заменяются одним присваиванием, поэтому
+        # search() без блокировки не увидит ключи от другой сборки.
+        self.data = ([], [])
+        self.lock = Lock()
+
+    def build(self):
+        rows = sorted(
+            (name.casefold(), pk, name, measurement_unit)
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        )
+        keys = [row[0] for row in rows]
+        ingredients = [
+            Ingredient(id=pk, name=name, measurement_unit=measurement_unit)
+            for _, pk, name, measurement_unit in rows
+        ]
+        self.data = (keys, ingredients)
+
+    def refresh(self):
+        version = get_table_version(Ingredient)
+        if version == self.version:
+            return
+        with self.lock:
+            if version != self.version:
+                self.build()
+                self.version = version
+
+    def search(self, prefix, limit):
+        """
+        To find ingredients which names start with prefix.
+        Exact match goes first, then shorter names.
+        """
+        self.refresh()
+        prefix = prefix.casefold()
+        keys, ingredients = self.data
+        start = bisect_left(keys, prefix)
+        end = start
+        while end < len(keys) and keys[end].startswith(prefix):
+            end += 1
+        ranked = sorted(
+            range(start, end),
+            key=lambda i: (keys[i] != prefix, len(keys[i]), keys[i])
+        )
+        return [ingredients[i] for i in ranked[:limit]]
+
+
+ingredient_index = IngredientPrefixIndex()
@@ -0,0 +1,74 @@
+import gzip
+
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from rest_framework.renderers import JSONRenderer
+
+from recipes.versions import get_table_version
+
+
+def accepts_gzip(accept_encoding):
+    """
+    To check 'Accept-Encoding' header for gzip with a non-zero
+    q-value, explicitly or through '*'.
+    """
+    qualities = {}
+    for coding in accept_encoding.split(','):
+        coding, *params = coding.strip().lower().split(';')
+        quality = 1.0
+        for param in params:
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.strip()] = quality
+    return qualities.get('gzip', qualities.get('*', 0.0)) > 0
+
+
+class PrerenderedListMixin:
+    """
+    To serve unfiltered list of a small, rarely changed table from
+    JSON bytes rendered once per worker. Gzip and identity variants
+    are kept, 'ETag' is derived from the table version and the
+    encoding, 'If-None-Match' is answered with 304.
+    """
+
+    # Отрендеренные списки воркера: класс вьюсета -> (версия, ответ).
+    prerendered = {}
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params:
+            return super().list(request, *args, **kwargs)
+
+        version = get_table_version(self.queryset.model)
+        cached = self.prerendered.get(type(self))
+        if cached is None or cached[0] != version:
+            cached = (version, self.render_list(version))
+            self.prerendered[type(self)] = cached
+        etag, identity, compressed = cached[1]
+
+        # У вариантов с разным кодированием разные ETag.
+        if accepts_gzip(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+            etag = f'"{etag}-gzip"'
+            body, encoding = compressed, 'gzip'
+        else:
+            etag = f'"{etag}"'
+            body, encoding = identity, None
+
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(body, content_type='application/json')
+            if encoding:
+                response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        response['Vary'] = 'Accept-Encoding'
+        return response
+
+    def render_list(self, version):
+        serializer = self.get_serializer(self.get_queryset(), many=True)
+        identity = JSONRenderer().render(serializer.data)
+        etag = f'{self.queryset.model._meta.db_table}-{version}'
+        return etag, identity, gzip.compress(identity)
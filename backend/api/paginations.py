@@ -1,5 +1,25 @@
-from rest_framework.pagination import PageNumberPagination
+import binascii
+import hashlib
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from datetime import datetime
 
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from recipes.models import TimelineEntry
+from recipes.versions import get_table_version
 from foodgram.settings import REST_FRAMEWORK  # isort:skip
 
 
@@ -10,3 +30,252 @@ class PageNumberLimitPagination(PageNumberPagination):
 
     page_size = REST_FRAMEWORK['PAGE_SIZE']
     page_size_query_param = 'limit'
+
+
+def estimate_count(model):
+    """
+    To get the planner estimate of the table size from pg_class.
+    Returns None if the database is not PostgreSQL.
+    """
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+            [model._meta.db_table]
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+class CachedCountPaginator(Paginator):
+    """
+    To cache exact COUNT(*) per filter signature for
+    PAGINATION_COUNT_CACHE_TIMEOUT seconds. The unfiltered table
+    is counted by pg_class.reltuples estimate if it exceeds
+    PAGINATION_COUNT_ESTIMATE_THRESHOLD.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        model = queryset.model
+        threshold = settings.PAGINATION_COUNT_ESTIMATE_THRESHOLD
+        if not queryset.query.where:
+            estimate = estimate_count(model)
+            if estimate is not None and estimate >= threshold:
+                return estimate
+
+        # Подпись фильтра - SQL запроса без аннотаций,
+        # поэтому общий список разделяют все пользователи.
+        sql, params = queryset.values('pk').query.sql_with_params()
+        signature = hashlib.md5(
+            f'{sql}{params!r}'.encode()
+        ).hexdigest()
+        version = get_table_version(model)
+        key = f'count:{model._meta.db_table}:{version}:{signature}'
+        count = cache.get(key)
+        if count is None:
+            count = super().count
+            cache.set(
+                key,
+                count,
+                settings.PAGINATION_COUNT_CACHE_TIMEOUT
+            )
+        return count
+
+
+class KeysetPagination(BasePagination):
+    """
+    To paginate with an opaque cursor over 'ordering' fields
+    instead of LIMIT/OFFSET. Each page is a range scan
+    from the last seen row, so deep pages cost as much as the first
+    one. No COUNT(*) is made, the response has no 'count' field.
+    Ordering requested from OrderingFilter of the view replaces
+    the default one, 'id' is added to it as a tie-breaker.
+    """
+
+    ordering = ('-pub_date', '-id')
+    page_size = REST_FRAMEWORK['PAGE_SIZE']
+    page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = self.get_ordering(request, queryset, view)
+        page_size = self.get_page_size(request)
+        position = self.decode_cursor(request, queryset.model)
+
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(position))
+
+        # Берем на одну запись больше, чтобы узнать,
+        # есть ли следующая страница.
+        results = list(queryset[:page_size + 1])
+        self.has_next = len(results) > page_size
+        self.page = results[:page_size]
+        return self.page
+
+    def get_ordering(self, request, queryset, view):
+        for backend in getattr(view, 'filter_backends', ()):
+            if not issubclass(backend, OrderingFilter):
+                continue
+            # Без параметра 'ordering' возвращается view.ordering.
+            fields = backend().get_ordering(request, queryset, view)
+            fields = [
+                field for field in fields or ()
+                if field.lstrip('-') not in ('id', 'pk')
+            ]
+            if fields and request.query_params.get(backend.ordering_param):
+                return (*fields, '-id')
+        return self.ordering
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return page_size if page_size > 0 else self.page_size
+
+    def get_keyset_filter(self, position):
+        # (a, b) < (x, y) раскрывается в a < x OR (a = x AND b < y).
+        keyset_filter = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            keyset_filter |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return keyset_filter
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        position = []
+        for field in self.ordering:
+            value = getattr(last, field.lstrip('-'))
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            position.append(value)
+        url = remove_query_param(self.request.build_absolute_uri(), 'page')
+        return replace_query_param(
+            url,
+            self.cursor_query_param,
+            self.encode_cursor(position)
+        )
+
+    def encode_cursor(self, position):
+        return urlsafe_b64encode(
+            json.dumps(position).encode()
+        ).decode()
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(urlsafe_b64decode(encoded.encode()))
+            if len(position) != len(self.ordering):
+                raise ValueError
+            return [
+                model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, position)
+            ]
+        except (
+            TypeError, ValueError, binascii.Error, DjangoValidationError
+        ):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class PageNumberOrKeysetPagination(PageNumberLimitPagination):
+    """
+    Page number pagination by default. Keyset pagination is used
+    if 'cursor' query param is present, e.g. '?cursor=' for the first page.
+    """
+
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.keyset_class.cursor_query_param in request.query_params:
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class CachedCountPagination(PageNumberOrKeysetPagination):
+    """
+    To paginate with cached or estimated 'count' field.
+    Lists filtered by user's favorites or shopping cart change
+    without a bump of the recipe table version, they are counted
+    exactly on every request.
+    """
+
+    django_paginator_class = CachedCountPaginator
+    user_scoped_params = ('is_favorited', 'is_in_shopping_cart')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        user_scoped = any(
+            request.query_params.get(param) == '1'
+            for param in self.user_scoped_params
+        )
+        self.django_paginator_class = (
+            Paginator if user_scoped else CachedCountPaginator
+        )
+        return super().paginate_queryset(queryset, request, view)
+
+
+class SubscriptionKeysetPagination(KeysetPagination):
+    """
+    Keyset pagination for authors in api/users/subscriptions/.
+    """
+
+    ordering = ('-id',)
+
+
+class SubscriptionPagination(PageNumberOrKeysetPagination):
+    """
+    To paginate api/users/subscriptions/ with page number or cursor.
+    """
+
+    keyset_class = SubscriptionKeysetPagination
+
+
+class FeedPagination(KeysetPagination):
+    """
+    Keyset pagination for api/recipes/feed/. Ids of the page are
+    read from user's timeline, then recipes are loaded by ids.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        position = self.decode_cursor(request, queryset.model)
+
+        recipe_ids = TimelineEntry.objects.feed(
+            request.user,
+            page_size + 1,
+            position
+        )
+        self.has_next = len(recipe_ids) > page_size
+        recipe_ids = recipe_ids[:page_size]
+        recipes = queryset.in_bulk(recipe_ids)
+        self.page = [
+            recipes[recipe_id] for recipe_id in recipe_ids
+            if recipe_id in recipes
+        ]
+        return self.page
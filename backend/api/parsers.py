@@ -0,0 +1,29 @@
+import json
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import DataAndFiles, MultiPartParser
+
+
+class MultiPartJSONParser(MultiPartParser):
+    """
+    To parse multipart/form-data with the JSON document of a recipe
+    in 'data' part and files, e.g. 'image', in their own parts.
+    Without 'data' part form fields are parsed as usual.
+    """
+
+    json_part = 'data'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parsed = super().parse(stream, media_type, parser_context)
+        if self.json_part not in parsed.data:
+            return parsed
+        try:
+            data = json.loads(parsed.data[self.json_part])
+        except ValueError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+        if not isinstance(data, dict):
+            raise ParseError('JSON parse error - ожидается объект.')
+        # Файлы переносятся в данные, чтобы request.data
+        # не смешивал словарь с MultiValueDict.
+        data.update(parsed.files.dict())
+        return DataAndFiles(data, {})
@@ -0,0 +1,29 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class ExportRenderer(BaseRenderer):
+    """
+    Base renderer of shopping list export formats. The export is
+    streamed by the view, renderers take part in content negotiation
+    with 'format' query param and render error responses.
+    """
+
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return JSONRenderer().render(data)
+
+
+class TxtExportRenderer(ExportRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class CsvExportRenderer(ExportRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class JsonExportRenderer(ExportRenderer):
+    media_type = 'application/json'
+    format = 'json'
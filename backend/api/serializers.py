@@ -1,4 +1,9 @@
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
 from django.contrib.auth.password_validation import validate_password
+from django.db import models, transaction
 from django.shortcuts import get_object_or_404
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
@@ -9,10 +14,59 @@ from rest_framework_simplejwt.serializers import PasswordField
 from recipes.models import (
     Ingredient, Tag, Recipe,
     IngredientAmountInRecipe,
-    ShoppingCart,
+    ImageUpload,
+    ShoppingListItem,
+)
+from recipes.versions import bump_table_version
+from .fields import (
+    IMAGE_TYPES, Base64ImageField, ImageSrcsetField, ImageThumbField,
 )
-from .fields import Base64ImageField
-from users.models import User
+from users.models import Subscription, User
+
+
+# Количество рецептов автора в ответе /api/users/subscriptions/.
+RECIPES_LIMIT_DEFAULT = 5
+RECIPES_LIMIT_MAX = 50
+
+# Количество рецептов в ответе /api/recipes/trending/.
+TRENDING_LIMIT_DEFAULT = 10
+TRENDING_LIMIT_MAX = 50
+
+
+class SubscribedAuthorsListSerializer(serializers.ListSerializer):
+    """
+    To load ids of authors on the page, which request user is
+    subscribed to, with a single query. The set is shared with
+    nested serializers through context['subscribed_authors'].
+    """
+
+    author_field = 'id'
+
+    def to_representation(self, data):
+        if isinstance(data, models.Manager):
+            data = data.all()
+        data = list(data)
+        user = self.context['request'].user
+        if not user.is_anonymous:
+            author_ids = {
+                getattr(obj, self.author_field) for obj in data
+            } - {None}
+            self.context['subscribed_authors'] = set(
+                Subscription.objects.filter(
+                    user=user,
+                    author__in=author_ids
+                ).values_list('author_id', flat=True)
+            )
+        return super().to_representation(data)
+
+
+class RecipeListSerializer(SubscribedAuthorsListSerializer):
+    """
+    To share subscriptions on authors of
+    :model:'recipes.Recipe' instances on the page.
+    """
+
+    author_field = 'author_id'
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -33,9 +87,14 @@ class UserSerializer(serializers.ModelSerializer):
             'is_subscribed',
         )
         read_only_fields = ('id', 'is_subscribed',)
+        list_serializer_class = SubscribedAuthorsListSerializer
 
     def get_is_subscribed(self, obj):
-
+        # Для списков подписки загружаются одним запросом
+        # в SubscribedAuthorsListSerializer.
+        subscribed_authors = self.context.get('subscribed_authors')
+        if subscribed_authors is not None:
+            return obj.id in subscribed_authors
         user = self.context['request'].user
         if user.is_anonymous:
             return False
@@ -139,10 +198,9 @@ class IngredientAmountSerializer(serializers.ModelSerializer):
     For nesting purposes only.
     """
 
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all(),
-        source='ingredient'
-    )
+    # Существование ингредиентов проверяется одним запросом
+    # в RecipeSerializer.validate.
+    id = serializers.IntegerField(min_value=1, source='ingredient_id')
 
     class Meta:
         model = IngredientAmountInRecipe
@@ -173,8 +231,15 @@ class RecipeSerializer(serializers.ModelSerializer):
 
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
-    ingredients = IngredientAmountSerializer(many=True)
+    ingredients = IngredientAmountSerializer(many=True, write_only=True)
+    tags = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        write_only=True
+    )
     image = Base64ImageField()
+    image_thumb = ImageThumbField()
+    image_srcset = ImageSrcsetField()
     author = UserSerializer(allow_null=True, read_only=True)
 
     class Meta:
@@ -184,6 +249,8 @@ class RecipeSerializer(serializers.ModelSerializer):
             'ingredients',
             'tags',
             'image',
+            'image_thumb',
+            'image_srcset',
             'name',
             'text',
             'cooking_time',
@@ -191,9 +258,13 @@ class RecipeSerializer(serializers.ModelSerializer):
             'is_favorited',
             'is_in_shopping_cart',
         )
+        list_serializer_class = RecipeListSerializer
 
     def get_is_favorited(self, obj):
-
+        # Значение аннотируется в RecipeViewSet.get_queryset,
+        # запрос выполняется, только если аннотации нет.
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context['request'].user
         if user.is_anonymous:
             return False
@@ -201,6 +272,8 @@ class RecipeSerializer(serializers.ModelSerializer):
 
     def get_is_in_shopping_cart(self, obj):
 
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context['request'].user
         if user.is_anonymous:
             return False
@@ -209,94 +282,375 @@ class RecipeSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         # Переопределяем, чтобы презентовать поля ManyToMany,
         # относящиеся к Recipe()
-        self.fields.pop('ingredients', 'tags')
         response = super().to_representation(instance)
+        amounts = instance.amount.all()
+        # Без prefetch из RecipeViewSet.get_queryset (после создания и
+        # изменения рецепта) ингредиенты загружаются одним запросом.
+        if 'amount' not in getattr(instance, '_prefetched_objects_cache', {}):
+            amounts = amounts.select_related('ingredient')
         response['ingredients'] = IngredientShowSerializer(
-            instance.amount.all(),
+            amounts,
             many=True
         ).data
         response['tags'] = TagSerializer(instance.tags.all(), many=True).data
         return response
 
+    def validate(self, attrs):
+        # Все id ингредиентов и тегов проверяются двумя запросами IN,
+        # ошибки по всем id возвращаются одним ответом.
+        errors = {}
+        if 'ingredients' in attrs:
+            ingredient_errors = self.check_ids(
+                Ingredient,
+                [item['ingredient_id'] for item in attrs['ingredients']],
+                'Ингредиентов не существует',
+                'Ингредиенты повторяются'
+            )
+            if ingredient_errors:
+                errors['ingredients'] = ingredient_errors
+        if 'tags' in attrs:
+            tag_errors = self.check_ids(
+                Tag,
+                attrs['tags'],
+                'Тегов не существует',
+                'Теги повторяются'
+            )
+            if tag_errors:
+                errors['tags'] = tag_errors
+        if errors:
+            raise ValidationError(errors)
+        return attrs
+
+    def check_ids(self, model, ids, missing_message, duplicate_message):
+        """To find unknown and repeated ids with a single query."""
+        errors = []
+        missing = set(ids) - set(
+            model.objects.filter(id__in=set(ids)).values_list('id', flat=True)
+        )
+        if missing:
+            errors.append(
+                f'{missing_message}: {", ".join(map(str, sorted(missing)))}.'
+            )
+        duplicates = {
+            value for value, count in Counter(ids).items() if count > 1
+        }
+        if duplicates:
+            errors.append(
+                f'{duplicate_message}: '
+                f'{", ".join(map(str, sorted(duplicates)))}.'
+            )
+        return errors
+
     def create(self, validated_data):
         # Переопределяем метод create для реализации
         # many-to-many связи между объектами.
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
-        recipe = Recipe.objects.create(
-            author=self.context['request'].user,
-            **validated_data
-        )
-        # Устанавливаем на рецепт ингредиенты и их количество.
-        lst_of_ingr = []
-        for dct in ingredients:
-            ingredient = dct.get('ingredient')
-            lst_of_ingr.append(
+        with transaction.atomic(), self.open_upload(validated_data['image']):
+            recipe = Recipe.objects.create(
+                author=self.context['request'].user,
+                **validated_data
+            )
+            # Ингредиенты с количеством и теги вставляются
+            # двумя запросами при любом их числе.
+            IngredientAmountInRecipe.objects.bulk_create([
                 IngredientAmountInRecipe(
                     recipe=recipe,
-                    ingredient=ingredient,
-                    amount=dct.get('amount')
+                    ingredient_id=item['ingredient_id'],
+                    amount=item['amount']
                 )
-            )
-        IngredientAmountInRecipe.objects.bulk_create(lst_of_ingr)
-
-        # Присоединяем к рецепту теги.
-        list_of_tags = []
-        for tag in tags:
-            new_tag = get_object_or_404(Tag, id=tag.id)
-            list_of_tags.append(new_tag)
-        recipe.tags.set(list_of_tags)
+                for item in ingredients
+            ])
+            Recipe.tags.through.objects.bulk_create([
+                Recipe.tags.through(recipe_id=recipe.id, tag_id=tag_id)
+                for tag_id in tags
+            ])
 
         return recipe
 
     def update(self, instance, validated_data):
+        # Изменения применяются разницей с текущими строками рецепта:
+        # неизмененные ингредиенты и теги не пересоздаются.
+        ingredients = validated_data.pop('ingredients', None)
+        tags = validated_data.pop('tags', None)
+
+        image = validated_data.get('image')
+        with transaction.atomic(), self.open_upload(image):
+            for field, value in validated_data.items():
+                setattr(instance, field, value)
+            if validated_data:
+                instance.save(update_fields=list(validated_data))
+
+            if tags is not None and self.set_tags(instance, tags):
+                # Теги участвуют в фильтрах списка рецептов.
+                bump_table_version(Recipe)
+
+            if (
+                ingredients is not None
+                and self.set_ingredients(instance, ingredients)
+            ):
+                # Ингредиенты рецепта изменились -
+                # пересчитываем списки покупок.
+                ShoppingListItem.objects.rebuild_for_recipe(instance)
 
-        instance.name = validated_data.get('name', instance.name)
-        instance.image = validated_data.get('image', instance.image)
-        instance.text = validated_data.get('text', instance.text)
-        instance.cooking_time = validated_data.get(
-            'cooking_time',
-            instance.cooking_time
-        )
-
-        ingredients = validated_data.pop('ingredients')
-        tags = validated_data.pop('tags')
-        instance.ingredients.clear()
+        return instance
 
-        lst_of_ingr = []
-        for dct in ingredients:
-            ingredient = dct.get('ingredient')
-            lst_of_ingr.append(
-                IngredientAmountInRecipe(
-                    recipe=instance,
-                    ingredient=ingredient,
-                    amount=dct.get('amount')
-                )
+    @contextmanager
+    def open_upload(self, image):
+        """
+        To open the file of :model:'recipes.ImageUpload', which the
+        image was taken from, while the recipe is saved, and to delete
+        the upload after the recipe is committed.
+        """
+        upload = getattr(image, 'upload', None)
+        if upload is None:
+            yield
+            return
+        with open(upload.path, 'rb') as file:
+            image.file = file
+            yield
+        transaction.on_commit(upload.discard)
+
+    def set_ingredients(self, recipe, ingredients):
+        """
+        To bring ingredient amounts of the recipe to the payload with
+        bulk_create, bulk_update and one filtered delete.
+        Returns True if anything changed.
+        """
+        amounts = {
+            item['ingredient_id']: item['amount'] for item in ingredients
+        }
+        # Текущие строки берутся из prefetch, если он есть.
+        current = {row.ingredient_id: row for row in recipe.amount.all()}
+
+        added = [
+            IngredientAmountInRecipe(
+                recipe=recipe,
+                ingredient_id=ingredient_id,
+                amount=amount
             )
-        IngredientAmountInRecipe.objects.bulk_create(lst_of_ingr)
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in current
+        ]
+        changed = []
+        for ingredient_id, row in current.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and amount != row.amount:
+                row.amount = amount
+                changed.append(row)
+        removed = current.keys() - amounts.keys()
+
+        if added:
+            IngredientAmountInRecipe.objects.bulk_create(added)
+        if changed:
+            IngredientAmountInRecipe.objects.bulk_update(changed, ['amount'])
+        if removed:
+            IngredientAmountInRecipe.objects.filter(
+                recipe=recipe,
+                ingredient_id__in=removed
+            ).delete()
+        return bool(added or changed or removed)
+
+    def set_tags(self, recipe, tags):
+        """
+        To bring tags of the recipe to the payload with one
+        bulk_create and one filtered delete.
+        Returns True if anything changed.
+        """
+        through = Recipe.tags.through
+        tag_ids = set(tags)
+        current = {tag.id for tag in recipe.tags.all()}
+
+        added = tag_ids - current
+        removed = current - tag_ids
+        if added:
+            through.objects.bulk_create([
+                through(recipe_id=recipe.id, tag_id=tag_id)
+                for tag_id in added
+            ])
+        if removed:
+            through.objects.filter(
+                recipe_id=recipe.id,
+                tag_id__in=removed
+            ).delete()
+        return bool(added or removed)
+
+
+class TrendingRecipeSerializer(RecipeSerializer):
+    """
+    To present :model:'recipes.Recipe' instance with
+    its trending score decayed to the moment of request.
+    """
 
-        list_of_tags = []
-        for tag in tags:
-            new_tag = get_object_or_404(Tag, id=tag.id)
-            list_of_tags.append(new_tag)
-        instance.tags.set(list_of_tags)
+    trending_score = serializers.FloatField(
+        source='current_trending_score',
+        read_only=True
+    )
 
-        return instance
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ('trending_score',)
+
+
+class ImageUploadSerializer(serializers.ModelSerializer):
+    """
+    To start :model:'recipes.ImageUpload' with declared size and
+    MIME type of the image and to present its progress.
+    """
+
+    content_type = serializers.ChoiceField(choices=list(IMAGE_TYPES))
+    size = serializers.IntegerField(min_value=1)
+    completed = serializers.BooleanField(read_only=True)
+
+    class Meta:
+        model = ImageUpload
+        fields = ('token', 'content_type', 'size', 'offset', 'completed',)
+        read_only_fields = ('token', 'offset',)
+
+    def validate_size(self, value):
+        if value > settings.IMAGE_UPLOAD_MAX_SIZE:
+            raise ValidationError(
+                'Размер изображения превышает '
+                f'{settings.IMAGE_UPLOAD_MAX_SIZE} байт.'
+            )
+        return value
 
 
 class RecipeMinifiedSerializer(serializers.ModelSerializer):
     """
     To provide a truncated representation of
     :model:'recipes.Recipe' instance.
+    Image is the narrowest rendition of the recipe image.
     """
 
-    image = Base64ImageField()
+    image = ImageThumbField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'name', 'image', 'cooking_time',)
 
 
+class RecipeIdsSerializer(serializers.Serializer):
+    """
+    To validate list of :model:'recipes.Recipe' ids
+    for bulk favorite and shopping cart endpoints.
+    """
+
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False
+    )
+
+    def validate_recipes(self, value):
+        # Все рецепты загружаются одним запросом.
+        recipes = list(Recipe.objects.filter(id__in=set(value)))
+        missing = set(value) - {recipe.id for recipe in recipes}
+        if missing:
+            raise ValidationError(
+                'Рецептов не существует: '
+                f'{", ".join(map(str, sorted(missing)))}.'
+            )
+        return recipes
+
+
+class AuthorIdsSerializer(serializers.Serializer):
+    """
+    To validate list of :model:'users.User' ids
+    for bulk subscribe endpoint.
+    """
+
+    authors = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False
+    )
+
+    def validate_authors(self, value):
+        author_ids = set(value)
+        if self.context['request'].user.id in author_ids:
+            raise ValidationError('Нельзя подписаться на самого себя.')
+        # Все авторы проверяются одним запросом.
+        missing = author_ids - set(
+            User.objects.filter(
+                id__in=author_ids
+            ).values_list('id', flat=True)
+        )
+        if missing:
+            raise ValidationError(
+                'Пользователей не существует: '
+                f'{", ".join(map(str, sorted(missing)))}.'
+            )
+        return sorted(author_ids)
+
+
+def get_limit(request, param, default, maximum):
+    """
+    To validate non-negative integer query param and to cap it
+    with maximum.
+    """
+    limit = request.query_params.get(param)
+    if limit is None:
+        return default
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise ValidationError(
+            {param: 'Введите целое число.'}
+        )
+    if limit < 0:
+        raise ValidationError(
+            {param: 'Значение не может быть отрицательным.'}
+        )
+    return min(limit, maximum)
+
+
+def get_recipes_limit(request):
+    """
+    To validate 'recipes_limit' query param and to cap it
+    with RECIPES_LIMIT_MAX.
+    """
+    return get_limit(
+        request,
+        'recipes_limit',
+        RECIPES_LIMIT_DEFAULT,
+        RECIPES_LIMIT_MAX
+    )
+
+
+def get_trending_limit(request):
+    """
+    To validate 'limit' query param of trending recipes and
+    to cap it with TRENDING_LIMIT_MAX.
+    """
+    return get_limit(
+        request,
+        'limit',
+        TRENDING_LIMIT_DEFAULT,
+        TRENDING_LIMIT_MAX
+    )
+
+
+class UserWithRecipesListSerializer(SubscribedAuthorsListSerializer):
+    """
+    To load the latest recipes of every author on the page with
+    a single window-function query. Recipes are distributed
+    through context['author_recipes'].
+    """
+
+    def to_representation(self, data):
+        if isinstance(data, models.Manager):
+            data = data.all()
+        data = list(data)
+        recipes_limit = get_recipes_limit(self.context['request'])
+        author_recipes = {obj.id: [] for obj in data}
+        if author_recipes and recipes_limit:
+            for recipe in Recipe.objects.latest_by_author(
+                list(author_recipes),
+                recipes_limit
+            ):
+                author_recipes[recipe.author_id].append(recipe)
+        self.context['author_recipes'] = author_recipes
+        return super().to_representation(data)
+
+
 class UserWithRecipeMinifiedSerializer(UserSerializer):
     """
     To provide combined serializer with both UserSerializer fields
@@ -308,22 +662,29 @@ class UserWithRecipeMinifiedSerializer(UserSerializer):
 
     class Meta(UserSerializer.Meta):
         fields = UserSerializer.Meta.fields + ('recipes', 'recipes_count',)
+        list_serializer_class = UserWithRecipesListSerializer
 
     def to_representation(self, instance):
         # Если автор не опубликовал рецепт, возвращаем дефолтное значение,
         # чтобы избежать KeyError.
         self.fields.pop('recipes', 'recipes')
         response = super().to_representation(instance)
-        # Определяем, если поступил параметр - количество рецептов на странице.
-        # Если параметр не задан, количество рецептов лимитируется 5.
-        lmt = self.context['request'].query_params.get('recipes_limit') or 5
+        # Для списков рецепты загружаются одним запросом
+        # в UserWithRecipesListSerializer.
+        author_recipes = self.context.get('author_recipes', {})
+        if instance.id in author_recipes:
+            recipes = author_recipes[instance.id]
+        else:
+            recipes = instance.recipe.all().order_by('-pub_date')[
+                :get_recipes_limit(self.context['request'])
+            ]
         response['recipes'] = RecipeMinifiedSerializer(
-            instance.recipe.all().order_by('-pub_date')[:int(lmt)],
+            recipes,
             many=True
         ).data
 
         return response
 
-    # Считаем количество рецептов автора.
+    # Количество рецептов автора хранится в User.recipes_count.
     def get_recipes_count(self, obj):
-        return obj.recipe.all().count()
+        return obj.recipes_count
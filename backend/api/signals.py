@@ -0,0 +1,62 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from jobs.models import Job
+from recipes.models import (
+    Ingredient, Recipe, ShoppingCart, ShoppingListItem, Tag,
+)
+from recipes.versions import bump_table_version
+from users.models import User
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    """
+    To drop cached recipe counts, to count author's recipes and
+    to push the recipe to followers' feeds when a recipe is created.
+    """
+    if created:
+        bump_table_version(Recipe)
+        User.objects.filter(pk=instance.author_id).update(
+            recipes_count=F('recipes_count') + 1
+        )
+        Job.objects.enqueue('recipes.tasks.fan_out', instance.id)
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleting(sender, instance, **kwargs):
+    """To remember users, who have the recipe in shopping cart."""
+    instance.shopping_cart_users = list(
+        ShoppingCart.objects.filter(
+            recipe=instance
+        ).values_list('user_id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    """
+    To drop cached recipe counts, to count author's recipes
+    and to recompute shopping lists when a recipe is deleted.
+    """
+    bump_table_version(Recipe)
+    User.objects.filter(pk=instance.author_id).update(
+        recipes_count=F('recipes_count') - 1
+    )
+    if getattr(instance, 'shopping_cart_users', None):
+        ShoppingListItem.objects.rebuild(instance.shopping_cart_users)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, instance, **kwargs):
+    """To rebuild ingredient index and list when ingredients change."""
+    bump_table_version(Ingredient)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    """To rebuild prerendered tag list when tags change."""
+    bump_table_version(Tag)
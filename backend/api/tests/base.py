@@ -0,0 +1,31 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe
+from recipes.tests import create_user
+
+
+class RecipeAPITestCase(TestCase):
+    """
+    Base case with two users and a few recipes of the first one.
+    """
+
+    recipes_count = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [create_user(number) for number in range(2)]
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.users[0],
+                name=f'Рецепт {number}',
+                text='Описание',
+                cooking_time=number + 1,
+                image=f'recipes/images/{number}.png'
+            )
+            for number in range(cls.recipes_count)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[1])
@@ -0,0 +1,116 @@
+from django.test import override_settings
+
+from jobs.models import Job
+from recipes.models import Favorite, Recipe, ShoppingCart
+from .base import RecipeAPITestCase
+
+MISSING_ID = 10 ** 6
+
+
+@override_settings(JOBS_RUN_INLINE=False)
+class ActivityTests(RecipeAPITestCase):
+
+    def recount(self):
+        # Остальные задачи (например, превью изображений) не нужны.
+        Job.objects.exclude(name='recipes.tasks.recount_counters').delete()
+        for job in Job.objects.claim(100, 60):
+            self.assertTrue(job.run())
+
+    def counters(self, field):
+        return list(Recipe.objects.order_by('id').values_list(
+            field, flat=True
+        ))
+
+    def ids(self, *numbers):
+        return [self.recipes[number].id for number in numbers]
+
+
+class SingleActivityTests(ActivityTests):
+
+    def check_single(self, path, field):
+        url = f'/api/recipes/{self.recipes[0].id}/{path}/'
+        self.assertEqual(self.client.post(url).status_code, 200)
+        self.assertEqual(self.client.post(url).status_code, 400)
+        self.assertEqual(self.counters(field)[0], 1)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.delete(url).status_code, 400)
+        self.assertEqual(self.counters(field)[0], 0)
+
+    def test_favorite(self):
+        self.check_single('favorite', 'favorites_count')
+
+    def test_shopping_cart(self):
+        self.check_single('shopping_cart', 'in_carts_count')
+
+    def test_missing_recipe(self):
+        for path in ('favorite', 'shopping_cart'):
+            url = f'/api/recipes/{MISSING_ID}/{path}/'
+            with self.subTest(path=path):
+                self.assertEqual(self.client.post(url).status_code, 404)
+                self.assertEqual(self.client.delete(url).status_code, 404)
+
+
+class BulkActivityTests(ActivityTests):
+
+    def bulk(self, path, method, recipe_ids):
+        return getattr(self.client, method)(
+            f'/api/recipes/{path}/',
+            {'recipes': recipe_ids},
+            format='json'
+        )
+
+    def check_bulk(self, path, field, related):
+        response = self.bulk(path, 'post', self.ids(0, 1))
+        self.assertEqual(response.status_code, 200)
+        self.assertCountEqual(
+            [recipe['id'] for recipe in response.json()],
+            self.ids(0, 1)
+        )
+        # Уже добавленные рецепты пропускаются и не считаются дважды.
+        self.assertEqual(
+            self.bulk(path, 'post', self.ids(1, 2)).status_code,
+            200
+        )
+        self.assertEqual(self.bulk(path, 'post', self.ids(2)).status_code, 200)
+        self.recount()
+        self.assertEqual(self.counters(field), [1, 1, 1, 0, 0])
+        self.assertEqual(related().count(), 3)
+
+        response = self.bulk(path, 'delete', self.ids(0, 1, 3))
+        self.assertEqual(response.status_code, 204)
+        self.recount()
+        self.assertEqual(self.counters(field), [0, 0, 1, 0, 0])
+        self.assertEqual(related().count(), 1)
+
+    def test_favorite(self):
+        self.check_bulk(
+            'favorite',
+            'favorites_count',
+            lambda: Favorite.objects.filter(user=self.users[1])
+        )
+
+    def test_shopping_cart(self):
+        self.assertFalse(ShoppingCart.objects.exists())
+        self.check_bulk(
+            'shopping_cart',
+            'in_carts_count',
+            lambda: ShoppingCart.objects.get(user=self.users[1]).recipe
+        )
+
+    def test_missing_recipe(self):
+        for path in ('favorite', 'shopping_cart'):
+            with self.subTest(path=path):
+                response = self.bulk(path, 'post', [*self.ids(0), MISSING_ID])
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.counters('favorites_count')[0], 0)
+        self.assertFalse(Favorite.objects.exists())
+
+    def test_empty_list(self):
+        self.assertEqual(self.bulk('favorite', 'post', []).status_code, 400)
+
+    def test_anonymous(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(
+            self.bulk('favorite', 'post', self.ids(0)).status_code,
+            401
+        )
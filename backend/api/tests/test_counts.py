@@ -0,0 +1,70 @@
+from unittest import mock
+
+from django.db import connection, transaction
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from recipes.tests import create_recipe, create_user
+from .base import RecipeAPITestCase
+
+
+def count_queries(queries):
+    return sum('COUNT(' in query['sql'] for query in queries)
+
+
+class CachedCountTests(RecipeAPITestCase):
+
+    def get_count(self, url='/api/recipes/'):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data['count'], count_queries(context.captured_queries)
+
+    def test_count_is_cached_per_filter(self):
+        self.assertEqual(self.get_count(), (self.recipes_count, 1))
+        self.assertEqual(self.get_count(), (self.recipes_count, 0))
+        url = f'/api/recipes/?author={self.users[1].id}'
+        self.assertEqual(self.get_count(url), (0, 1))
+        self.assertEqual(self.get_count(url), (0, 0))
+
+    def test_user_scoped_counts_are_not_cached(self):
+        for param, manager in (
+            ('is_favorited', Favorite.objects),
+            ('is_in_shopping_cart', ShoppingCart.objects),
+        ):
+            url = f'/api/recipes/?{param}=1'
+            self.assertEqual(self.get_count(url), (0, 1))
+            manager.add(self.users[1], [self.recipes[0].id])
+            self.assertEqual(self.get_count(url), (1, 1))
+            response = self.client.get(url)
+            self.assertEqual(len(response.data['results']), 1)
+
+    @override_settings(PAGINATION_COUNT_ESTIMATE_THRESHOLD=100)
+    def test_estimate_for_large_unfiltered_table(self):
+        with mock.patch('api.paginations.estimate_count', return_value=1000):
+            self.assertEqual(self.get_count(), (1000, 0))
+            url = f'/api/recipes/?author={self.users[0].id}'
+            self.assertEqual(self.get_count(url), (self.recipes_count, 1))
+
+    @override_settings(PAGINATION_COUNT_ESTIMATE_THRESHOLD=100)
+    def test_exact_count_below_threshold(self):
+        with mock.patch('api.paginations.estimate_count', return_value=10):
+            self.assertEqual(self.get_count(), (self.recipes_count, 1))
+
+
+class CachedCountInvalidationTests(TransactionTestCase):
+
+    def test_count_refreshed_after_commit(self):
+        author = create_user(0)
+        client = APIClient()
+        client.force_authenticate(author)
+        create_recipe(author)
+        self.assertEqual(client.get('/api/recipes/').data['count'], 1)
+        with transaction.atomic():
+            recipe = create_recipe(author)
+            self.assertEqual(client.get('/api/recipes/').data['count'], 1)
+        self.assertEqual(client.get('/api/recipes/').data['count'], 2)
+        Recipe.objects.filter(pk=recipe.pk).delete()
+        self.assertEqual(client.get('/api/recipes/').data['count'], 1)
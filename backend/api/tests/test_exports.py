@@ -0,0 +1,158 @@
+import csv
+import io
+import json
+from unittest import mock
+
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, ShoppingCart, ShoppingListItem
+from recipes.tests import create_recipe, create_user
+
+URL = '/api/recipes/download_shopping_cart/'
+
+
+class ShoppingListMixin:
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(0)
+        cls.ingredients = [
+            Ingredient.objects.create(name=name, measurement_unit=unit)
+            for name, unit in (('мука', 'г'), ('молоко', 'мл'), ('яйца', 'шт'))
+        ]
+        cls.recipe = create_recipe(cls.user, {
+            ingredient.id: amount
+            for ingredient, amount in zip(cls.ingredients, (200, 500, 2))
+        })
+        ShoppingCart.objects.add(cls.user, [cls.recipe.id])
+        ShoppingListItem.objects.add_recipe(cls.user, cls.recipe)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def download(self, export_format, **headers):
+        return self.client.get(URL, {'format': export_format}, **headers)
+
+    def content(self, response):
+        if response.streaming:
+            return b''.join(response.streaming_content).decode()
+        return response.content.decode()
+
+
+class ExportTestCase(ShoppingListMixin, TestCase):
+    pass
+
+
+class ExportFormatTests(ExportTestCase):
+
+    def test_txt(self):
+        response = self.download('txt')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertEqual(
+            response['Content-Disposition'],
+            'attachment; filename="shopping_list.txt"'
+        )
+        self.assertEqual(self.content(response), (
+            'Список покупок:\n'
+            'молоко: 500 мл\n'
+            'мука: 200 г\n'
+            'яйца: 2 шт'
+        ))
+
+    def test_csv(self):
+        response = self.download('csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.reader(io.StringIO(self.content(response))))
+        self.assertEqual(rows, [
+            ['name', 'measurement_unit', 'amount'],
+            ['молоко', 'мл', '500'],
+            ['мука', 'г', '200'],
+            ['яйца', 'шт', '2'],
+        ])
+
+    def test_json(self):
+        response = self.download('json')
+        self.assertEqual(
+            response['Content-Type'],
+            'application/json; charset=utf-8'
+        )
+        self.assertEqual(json.loads(self.content(response)), [
+            {'name': 'молоко', 'measurement_unit': 'мл', 'amount': 500},
+            {'name': 'мука', 'measurement_unit': 'г', 'amount': 200},
+            {'name': 'яйца', 'measurement_unit': 'шт', 'amount': 2},
+        ])
+
+    def test_empty_list(self):
+        ShoppingListItem.objects.all().delete()
+        self.assertEqual(self.content(self.download('json')), '[]')
+
+    def test_unknown_format(self):
+        self.assertEqual(self.download('xml').status_code, 404)
+
+    def test_single_chunk_has_content_length(self):
+        response = self.download('csv')
+        self.assertFalse(response.streaming)
+        self.assertEqual(
+            int(response['Content-Length']),
+            len(response.content)
+        )
+
+    def test_large_export_is_streamed(self):
+        with mock.patch('api.exports.EXPORT_CHUNK_ROWS', 2):
+            response = self.download('json')
+            self.assertTrue(response.streaming)
+            self.assertFalse(response.has_header('Content-Length'))
+            chunks = list(response.streaming_content)
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(len(json.loads(b''.join(chunks))), 3)
+
+
+class ExportCacheTests(ExportTestCase):
+
+    def test_not_modified(self):
+        etag = self.download('txt')['ETag']
+        response = self.download('txt', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertNotEqual(self.download('csv')['ETag'], etag)
+
+    def test_cached_export_is_reused(self):
+        first = self.download('csv')
+        with mock.patch('api.exports.shopping_list') as shopping_list:
+            second = self.download('csv')
+        shopping_list.assert_not_called()
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(
+            int(second['Content-Length']),
+            len(second.content)
+        )
+
+    def test_cart_change_changes_etag(self):
+        etag = self.download('txt')['ETag']
+        recipe = create_recipe(self.user, {self.ingredients[0].id: 100})
+        ShoppingCart.objects.add(self.user, [recipe.id])
+        ShoppingListItem.objects.add_recipe(self.user, recipe)
+        response = self.download('txt', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('мука: 300 г', self.content(response))
+
+
+class ExportInvalidationTests(ShoppingListMixin, TransactionTestCase):
+
+    def setUp(self):
+        self.setUpTestData()
+        super().setUp()
+
+    def test_ingredient_rename_changes_export(self):
+        etag = self.download('txt')['ETag']
+        ingredient = self.ingredients[0]
+        ingredient.name = 'мука пшеничная'
+        ingredient.save()
+        response = self.download('txt', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('мука пшеничная: 200 г', self.content(response))
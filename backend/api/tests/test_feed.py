@@ -0,0 +1,120 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from jobs.models import Job
+from recipes.models import Recipe, TimelineEntry
+from recipes.tests import create_recipe, create_user
+from users.models import Subscription
+
+URL = '/api/recipes/feed/'
+
+
+@override_settings(JOBS_RUN_INLINE=False, FEED_FANOUT_MAX_FOLLOWERS=1)
+class FeedTests(TestCase):
+    """
+    The first author has one follower and is fanned out,
+    the second one has two and is merged into the feed on read.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader, cls.pushed, cls.pulled, cls.other = (
+            create_user(number) for number in range(4)
+        )
+        Subscription.objects.add(cls.other, [cls.pulled.id])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def subscribe(self, author, method='post'):
+        response = getattr(self.client, method)(
+            f'/api/users/{author.id}/subscribe/'
+        )
+        self.assertLess(response.status_code, 300)
+
+    def publish(self):
+        """
+        To publish three recipes of each author with interleaved
+        dates, the pulled author's recipe is always the newer one.
+        Returns ids of the expected feed.
+        """
+        start = timezone.now() - timedelta(days=1)
+        ids = []
+        for number in range(3):
+            for offset, author in enumerate((self.pushed, self.pulled)):
+                recipe = create_recipe(author)
+                Recipe.objects.filter(pk=recipe.pk).update(
+                    pub_date=start + timedelta(minutes=2 * number + offset)
+                )
+                ids.append(recipe.id)
+        # Рассылка выполняется воркером, превью здесь не нужны.
+        Job.objects.exclude(name='recipes.tasks.fan_out').delete()
+        for job in Job.objects.claim(100, 60):
+            self.assertTrue(job.run())
+        return ids[::-1]
+
+    def walk(self, limit):
+        pages = []
+        url = f'{URL}?limit={limit}'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([recipe['id'] for recipe in response.data['results']])
+            url = response.data['next']
+        return pages
+
+    def timeline(self):
+        return set(TimelineEntry.objects.filter(
+            user=self.reader
+        ).values_list('author_id', flat=True))
+
+    def test_pushed_and_pulled_authors(self):
+        self.subscribe(self.pushed)
+        self.subscribe(self.pulled)
+        expected = self.publish()
+        # В ленту рассылаются только рецепты автора с малым числом
+        # подписчиков, рецепты второго читаются при запросе.
+        self.assertEqual(self.timeline(), {self.pushed.id})
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(),
+            3
+        )
+        self.assertEqual(sum(self.walk(10), []), expected)
+
+    def test_cursor_crosses_both_sources(self):
+        self.subscribe(self.pushed)
+        self.subscribe(self.pulled)
+        expected = self.publish()
+        pages = self.walk(2)
+        self.assertEqual(
+            pages,
+            [expected[:2], expected[2:4], expected[4:]]
+        )
+        pages = self.walk(4)
+        self.assertEqual(pages, [expected[:4], expected[4:]])
+
+    def test_backfill_on_follow(self):
+        expected = self.publish()
+        self.subscribe(self.pushed)
+        self.assertEqual(self.timeline(), {self.pushed.id})
+        self.assertEqual(sum(self.walk(10), []), expected[1::2])
+
+    def test_unfollow(self):
+        self.subscribe(self.pushed)
+        self.subscribe(self.pulled)
+        expected = self.publish()
+
+        self.subscribe(self.pushed, 'delete')
+        self.assertEqual(self.timeline(), set())
+        self.assertEqual(sum(self.walk(10), []), expected[::2])
+
+        self.subscribe(self.pulled, 'delete')
+        self.assertEqual(self.walk(10), [[]])
+
+    def test_anonymous(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(URL).status_code, 401)
@@ -0,0 +1,107 @@
+import io
+import textwrap
+from base64 import b64encode
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+
+from ..fields import Base64ImageField
+
+
+def image_bytes(pillow_format, size=(16, 16)):
+    buffer = io.BytesIO()
+    image = Image.new('RGB', size)
+    # Шум, чтобы изображение не сжалось до нескольких байт.
+    image.putdata([
+        (x * 37 % 256, y * 91 % 256, (x * y) % 256)
+        for y in range(size[1]) for x in range(size[0])
+    ])
+    image.save(buffer, pillow_format)
+    return buffer.getvalue()
+
+
+def data_url(content, mime_type='image/png', wrap=None):
+    encoded = b64encode(content).decode()
+    if wrap:
+        encoded = '\r\n'.join(textwrap.wrap(encoded, wrap))
+    return f'data:{mime_type};base64,{encoded}'
+
+
+class Base64ImageFieldTests(SimpleTestCase):
+
+    def decode(self, data):
+        file = Base64ImageField().to_internal_value(data)
+        self.addCleanup(file.close)
+        return file
+
+    def assertFails(self, data, code):
+        with self.assertRaises(ValidationError) as context:
+            self.decode(data)
+        self.assertEqual(context.exception.get_codes(), [code])
+
+    def test_decode(self):
+        content = image_bytes('PNG')
+        file = self.decode(data_url(content))
+        self.assertEqual(file.content_type, 'image/png')
+        self.assertEqual(file.size, len(content))
+        self.assertTrue(file.name.endswith('.png'))
+        file.seek(0)
+        self.assertEqual(file.read(), content)
+
+    def test_wrapped_base64(self):
+        content = image_bytes('PNG')
+        for wrap in (76, 64):
+            # Срезы не кратны 4 символам и разрезают переносы строк.
+            for chunk_size in (10, 77, 64 * 1024):
+                with self.subTest(wrap=wrap, chunk_size=chunk_size), \
+                        mock.patch('api.fields.BASE64_CHUNK_SIZE', chunk_size):
+                    file = self.decode(data_url(content, wrap=wrap))
+                    file.seek(0)
+                    self.assertEqual(file.read(), content)
+
+    def test_size_cap(self):
+        content = image_bytes('PNG')
+        with override_settings(IMAGE_UPLOAD_MAX_SIZE=len(content)):
+            self.decode(data_url(content, wrap=76))
+        with override_settings(IMAGE_UPLOAD_MAX_SIZE=len(content) - 1):
+            self.assertFails(data_url(content), 'too_large')
+            # Пробелы не обходят проверку размера декодированных данных.
+            self.assertFails(
+                data_url(content).replace('A', ' A', 1),
+                'too_large'
+            )
+        with override_settings(IMAGE_UPLOAD_MAX_SIZE=len(content) // 2):
+            self.assertFails(data_url(content, wrap=76), 'too_large')
+
+    def test_type_mismatch(self):
+        self.assertFails(
+            data_url(image_bytes('JPEG'), 'image/png'),
+            'invalid_image'
+        )
+        self.assertFails(
+            data_url(image_bytes('PNG'), 'image/bmp'),
+            'unsupported_type'
+        )
+
+    def test_malformed_input(self):
+        encoded = b64encode(image_bytes('PNG')).decode()
+        for data, code in (
+            ('data:image/png,' + encoded, 'invalid_data_url'),
+            ('data:image/png;base64,' + encoded[:-1], 'invalid_base64'),
+            ('data:image/png;base64,' + encoded + '!', 'invalid_base64'),
+            ('data:image/png;base64,QQ==' + encoded, 'invalid_base64'),
+            ('data:image/png;base64,\r\n', 'empty'),
+            ('data:image/png;base64,' + b64encode(b'text').decode(),
+             'invalid_image'),
+        ):
+            with self.subTest(data=data[:30], code=code):
+                self.assertFails(data, code)
+
+    def test_padding_split_between_slices(self):
+        with mock.patch('api.fields.BASE64_CHUNK_SIZE', 4):
+            self.assertFails(
+                'data:image/png;base64,QQ==QUFB',
+                'invalid_base64'
+            )
@@ -0,0 +1,64 @@
+from django.db import connection
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from recipes.models import Favorite, Recipe, ShoppingCart, Tag
+from ..filters import RecipeFilterBackend
+from .base import RecipeAPITestCase
+
+
+class RecipeFilterBackendTests(RecipeAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.tags = [
+            Tag.objects.create(name=slug, color=color, slug=slug)
+            for slug, color in (('breakfast', '#E26C2D'), ('lunch', '#49B64E'))
+        ]
+        # Рецепт с обоими тегами не должен повториться в выдаче.
+        cls.recipes[0].tags.set(cls.tags)
+        cls.recipes[1].tags.set(cls.tags[:1])
+        cls.recipes[2].tags.set(cls.tags[1:])
+        recipe_ids = [recipe.id for recipe in cls.recipes[:3]]
+        Favorite.objects.add(cls.users[1], recipe_ids)
+        ShoppingCart.objects.add(cls.users[1], recipe_ids[:2])
+
+    def filter_queryset(self, params):
+        request = Request(APIRequestFactory().get('/api/recipes/', params))
+        request.user = self.users[1]
+        view = type('View', (), {'detail': False})()
+        return RecipeFilterBackend().filter_queryset(
+            request,
+            Recipe.objects.all(),
+            view
+        )
+
+    def test_combined_filters(self):
+        queryset = self.filter_queryset({
+            'author': self.users[0].id,
+            'tags': [tag.slug for tag in self.tags],
+            'is_favorited': '1',
+            'is_in_shopping_cart': '1',
+        })
+        self.assertEqual(
+            sorted(recipe.id for recipe in queryset),
+            sorted(recipe.id for recipe in self.recipes[:2])
+        )
+
+    def test_combined_filters_plan(self):
+        queryset = self.filter_queryset({
+            'author': self.users[0].id,
+            'tags': [tag.slug for tag in self.tags],
+            'is_favorited': '1',
+            'is_in_shopping_cart': '1',
+        })
+        self.assertNotIn('DISTINCT', str(queryset.query))
+        plan = queryset.explain()
+        self.assertNotIn('DISTINCT', plan.upper())
+        # Каждый фильтр - подзапрос по id, а не JOIN,
+        # размножающий строки рецептов.
+        if connection.vendor == 'postgresql':
+            self.assertRegex(plan, 'Semi Join|SubPlan')
+        elif connection.vendor == 'sqlite':
+            self.assertEqual(plan.count('LIST SUBQUERY'), 3)
@@ -0,0 +1,66 @@
+import json
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient
+
+NAMES = (
+    'Абрикос', 'абрикосовый джем', 'абрикосы сушеные', 'банан',
+    'молоко', 'молоко топленое', 'мука', 'сахар',
+)
+
+
+class IngredientSearchTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г') for name in NAMES
+        )
+
+    def search(self, name):
+        response = APIClient().get('/api/ingredients/', {'name': name})
+        self.assertEqual(response.status_code, 200)
+        return [ingredient['name'] for ingredient in response.data]
+
+
+@override_settings(INGREDIENT_SEARCH_BACKEND='memory')
+class MemoryIngredientSearchTests(IngredientSearchTestCase):
+
+    def test_prefix_ignores_case(self):
+        self.assertEqual(self.search('АБР'), [
+            'Абрикос', 'абрикосовый джем', 'абрикосы сушеные',
+        ])
+
+    def test_exact_match_first(self):
+        self.assertEqual(self.search('молоко'), ['молоко', 'молоко топленое'])
+
+    @override_settings(INGREDIENT_SEARCH_LIMIT=2)
+    def test_limit(self):
+        self.assertEqual(len(self.search('а')), 2)
+
+    def test_without_name(self):
+        response = APIClient().get('/api/ingredients/')
+        self.assertEqual(len(json.loads(response.content)), len(NAMES))
+
+
+@override_settings(INGREDIENT_SEARCH_BACKEND='database')
+class DatabaseIngredientSearchTests(IngredientSearchTestCase):
+
+    def test_prefix(self):
+        self.assertEqual(
+            sorted(self.search('мол')),
+            ['молоко', 'молоко топленое']
+        )
+
+    @skipUnless(connection.vendor == 'postgresql', 'PostgreSQL ranking')
+    def test_ranking(self):
+        self.assertEqual(self.search('молоко')[:2], [
+            'молоко', 'молоко топленое',
+        ])
+        # Подстрока, затем опечатка по триграммам.
+        self.assertIn('молоко топленое', self.search('топлен'))
+        self.assertIn('абрикосовый джем', self.search('абрикосовй'))
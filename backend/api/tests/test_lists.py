@@ -0,0 +1,90 @@
+import gzip
+import json
+
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+
+from recipes.models import Tag
+from ..mixins import accepts_gzip
+
+URL = '/api/tags/'
+
+
+class AcceptsGzipTests(SimpleTestCase):
+
+    def test_accept_encoding(self):
+        for header, expected in (
+            ('', False),
+            ('gzip', True),
+            ('deflate, gzip;q=0.5', True),
+            ('gzip;q=0', False),
+            ('GZIP; q=0.0, br', False),
+            ('*', True),
+            ('*;q=0', False),
+            ('gzip;q=0, *', False),
+            ('br, *;q=0.1', True),
+            ('gzip;q=x', False),
+        ):
+            with self.subTest(header=header):
+                self.assertIs(accepts_gzip(header), expected)
+
+
+class PrerenderedListTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Tag.objects.create(name='Завтрак', color='#E26C2D', slug='breakfast')
+
+    def get(self, **headers):
+        return APIClient().get(URL, **headers)
+
+    def test_identity_and_gzip_variants(self):
+        identity = self.get()
+        compressed = self.get(HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertFalse(identity.has_header('Content-Encoding'))
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertEqual(
+            gzip.decompress(compressed.content),
+            identity.content
+        )
+        self.assertEqual(json.loads(identity.content)[0]['slug'], 'breakfast')
+        self.assertNotEqual(identity['ETag'], compressed['ETag'])
+        self.assertIn('Accept-Encoding', identity['Vary'])
+
+    def test_gzip_refused_with_zero_quality(self):
+        response = self.get(HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_not_modified(self):
+        for encoding in ('', 'gzip'):
+            etag = self.get(HTTP_ACCEPT_ENCODING=encoding)['ETag']
+            response = self.get(
+                HTTP_ACCEPT_ENCODING=encoding,
+                HTTP_IF_NONE_MATCH=etag
+            )
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response['ETag'], etag)
+
+    def test_etag_of_other_encoding_does_not_match(self):
+        etag = self.get()['ETag']
+        response = self.get(
+            HTTP_ACCEPT_ENCODING='gzip',
+            HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_filtered_list_is_not_prerendered(self):
+        response = self.get(HTTP_ACCEPT_ENCODING='gzip', QUERY_STRING='a=1')
+        self.assertFalse(response.has_header('ETag'))
+
+
+class PrerenderedListInvalidationTests(TransactionTestCase):
+
+    def test_rerendered_after_change(self):
+        client = APIClient()
+        etag = client.get(URL)['ETag']
+        Tag.objects.create(name='Обед', color='#49B64E', slug='lunch')
+        response = client.get(URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(json.loads(response.content)), 1)
@@ -0,0 +1,30 @@
+from recipes.models import Recipe
+from .base import RecipeAPITestCase
+
+
+class KeysetPaginationTests(RecipeAPITestCase):
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [recipe['id'] for recipe in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def test_default_ordering(self):
+        ids = self.walk('/api/recipes/?cursor=&limit=2')
+        self.assertEqual(
+            ids,
+            [recipe.id for recipe in reversed(self.recipes)]
+        )
+
+    def test_requested_ordering(self):
+        for count, recipe in zip((1, 3, 3, 0, 2), self.recipes):
+            Recipe.objects.filter(pk=recipe.pk).update(favorites_count=count)
+        ids = self.walk(
+            '/api/recipes/?cursor=&limit=2&ordering=-favorites_count'
+        )
+        expected = Recipe.objects.order_by('-favorites_count', '-id')
+        self.assertEqual(ids, [recipe.id for recipe in expected])
@@ -0,0 +1,97 @@
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import Favorite, Ingredient, ShoppingCart, Tag
+from recipes.tests import create_recipe, create_user
+from users.models import Subscription
+
+
+class QueryCountTests(TestCase):
+    """
+    Pages of any size take the same number of queries.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = create_user(0)
+        cls.authors = [create_user(number) for number in range(1, 5)]
+        tags = [
+            Tag.objects.create(
+                name=f'Тег {number}',
+                color=f'#00000{number}',
+                slug=f'tag{number}'
+            )
+            for number in range(2)
+        ]
+        ingredients = [
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('мука', 'молоко', 'соль', 'сахар')
+        ]
+        cls.recipes = []
+        for author in cls.authors:
+            for number in range(4):
+                recipe = create_recipe(author, {
+                    ingredients[number].id: 10,
+                    ingredients[(number + 1) % 4].id: 5,
+                })
+                recipe.tags.set(tags)
+                cls.recipes.append(recipe)
+        Subscription.objects.add(
+            cls.viewer,
+            [author.id for author in cls.authors[:3]]
+        )
+        recipe_ids = [recipe.id for recipe in cls.recipes]
+        Favorite.objects.add(cls.viewer, recipe_ids[:5])
+        ShoppingCart.objects.add(cls.viewer, recipe_ids[:3])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def assertQueries(self, number, url, client=None):
+        # Кешированный COUNT(*) не должен влиять на результат.
+        cache.clear()
+        with self.assertNumQueries(number):
+            response = (client or self.client).get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_recipe_list(self):
+        # COUNT, страница, ингредиенты, теги, подписки на авторов.
+        for limit in (2, 16):
+            response = self.assertQueries(5, f'/api/recipes/?limit={limit}')
+            self.assertEqual(len(response.data['results']), limit)
+        recipe = next(
+            recipe for recipe in response.data['results']
+            if recipe['id'] == self.recipes[0].id
+        )
+        self.assertTrue(recipe['is_favorited'])
+        self.assertTrue(recipe['is_in_shopping_cart'])
+        self.assertTrue(recipe['author']['is_subscribed'])
+
+    def test_recipe_list_anonymous(self):
+        for limit in (2, 16):
+            self.assertQueries(4, f'/api/recipes/?limit={limit}', APIClient())
+
+    def test_recipe_detail(self):
+        response = self.assertQueries(4, f'/api/recipes/{self.recipes[0].id}/')
+        self.assertEqual(len(response.data['ingredients']), 2)
+        self.assertEqual(len(response.data['tags']), 2)
+
+    def test_subscriptions(self):
+        for limit in (1, 3):
+            response = self.assertQueries(
+                4,
+                f'/api/users/subscriptions/?limit={limit}'
+                f'&recipes_limit={limit}'
+            )
+            self.assertEqual(len(response.data['results']), limit)
+            for author in response.data['results']:
+                self.assertEqual(len(author['recipes']), limit)
+                self.assertEqual(author['recipes_count'], 4)
+
+    def test_user_list(self):
+        for limit in (2, 5):
+            response = self.assertQueries(3, f'/api/users/?limit={limit}')
+            self.assertEqual(len(response.data['results']), limit)
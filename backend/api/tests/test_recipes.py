@@ -0,0 +1,162 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import (
+    Ingredient, IngredientAmountInRecipe, ShoppingCart, ShoppingListItem, Tag,
+)
+from recipes.tests import create_recipe
+from .base import RecipeAPITestCase
+
+
+class RecipeValidationTests(RecipeAPITestCase):
+
+    image = (
+        'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAf'
+        'FcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=='
+    )
+
+    def test_tags_required(self):
+        ingredient = Ingredient.objects.create(
+            name='мука',
+            measurement_unit='г'
+        )
+        response = self.client.post('/api/recipes/', {
+            'name': 'Рецепт',
+            'text': 'Описание',
+            'cooking_time': 5,
+            'image': self.image,
+            'tags': [],
+            'ingredients': [{'id': ingredient.id, 'amount': 10}],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('tags', response.data)
+
+
+class RecipeUpdateTests(RecipeAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.flour, cls.milk, cls.salt = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('мука', 'молоко', 'соль')
+        )
+        cls.breakfast, cls.lunch = (
+            Tag.objects.create(name=name, color=color, slug=slug)
+            for name, color, slug in (
+                ('Завтрак', '#E26C2D', 'breakfast'),
+                ('Обед', '#49B64E', 'lunch'),
+            )
+        )
+        cls.recipe = create_recipe(
+            cls.users[1],
+            {cls.flour.id: 200, cls.milk.id: 500}
+        )
+        cls.recipe.tags.add(cls.breakfast)
+        ShoppingCart.objects.add(cls.users[1], [cls.recipe.id])
+        ShoppingListItem.objects.add_recipe(cls.users[1], cls.recipe)
+
+    def patch(self, data):
+        return self.client.patch(
+            f'/api/recipes/{self.recipe.id}/',
+            data,
+            format='json'
+        )
+
+    def amounts(self):
+        return dict(IngredientAmountInRecipe.objects.filter(
+            recipe=self.recipe
+        ).values_list('ingredient_id', 'amount'))
+
+    def amount_ids(self):
+        return set(IngredientAmountInRecipe.objects.filter(
+            recipe=self.recipe
+        ).values_list('id', flat=True))
+
+    def shopping_list(self):
+        return dict(ShoppingListItem.objects.filter(
+            user=self.users[1]
+        ).values_list('ingredient_id', 'total_amount'))
+
+    def cart_version(self):
+        return ShoppingCart.objects.get(user=self.users[1]).version
+
+    def test_scalar_fields_only(self):
+        amount_ids = self.amount_ids()
+        version = self.cart_version()
+        table = IngredientAmountInRecipe._meta.db_table
+        with CaptureQueriesContext(connection) as context:
+            response = self.patch({'name': 'Блины', 'cooking_time': 20})
+        self.assertEqual(response.status_code, 200)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.name, 'Блины')
+        self.assertEqual(self.recipe.cooking_time, 20)
+        # Ингредиенты не пересоздаются, список покупок не пересчитывается.
+        self.assertEqual(self.amount_ids(), amount_ids)
+        self.assertEqual(self.cart_version(), version)
+        self.assertFalse([
+            query['sql'] for query in context.captured_queries
+            if table in query['sql']
+            and not query['sql'].startswith('SELECT')
+        ])
+
+    def test_ingredient_amounts(self):
+        flour_row = IngredientAmountInRecipe.objects.get(
+            recipe=self.recipe,
+            ingredient=self.flour
+        )
+        response = self.patch({'ingredients': [
+            {'id': self.flour.id, 'amount': 250},
+            {'id': self.salt.id, 'amount': 5},
+        ]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.amounts(),
+            {self.flour.id: 250, self.salt.id: 5}
+        )
+        # Измененная строка обновляется на месте.
+        self.assertIn(flour_row.id, self.amount_ids())
+        self.assertCountEqual(
+            [
+                (item['id'], item['amount'])
+                for item in response.data['ingredients']
+            ],
+            [(self.flour.id, 250), (self.salt.id, 5)]
+        )
+        self.assertEqual(
+            self.shopping_list(),
+            {self.flour.id: 250, self.salt.id: 5}
+        )
+
+    def test_same_ingredients_do_not_rebuild(self):
+        version = self.cart_version()
+        response = self.patch({'ingredients': [
+            {'id': self.milk.id, 'amount': 500},
+            {'id': self.flour.id, 'amount': 200},
+        ]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.cart_version(), version)
+
+    def test_tags(self):
+        response = self.patch({'tags': [self.lunch.id]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [tag['slug'] for tag in response.data['tags']],
+            ['lunch']
+        )
+        self.assertEqual(
+            list(self.recipe.tags.values_list('slug', flat=True)),
+            ['lunch']
+        )
+
+    def test_unknown_ids_rejected(self):
+        response = self.patch({
+            'tags': [10 ** 6],
+            'ingredients': [{'id': 10 ** 6, 'amount': 1}],
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data), {'tags', 'ingredients'})
+        self.assertEqual(
+            self.amounts(),
+            {self.flour.id: 200, self.milk.id: 500}
+        )
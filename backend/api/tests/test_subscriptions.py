@@ -0,0 +1,86 @@
+from recipes.tests import create_user
+from users.models import Subscription, User
+from .base import RecipeAPITestCase
+
+
+class SubscriptionTests(RecipeAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.users.append(create_user(2))
+
+    def followers(self):
+        return list(User.objects.order_by('id').values_list(
+            'followers_count', flat=True
+        ))
+
+    def subscribe(self, user, method='post'):
+        return getattr(self.client, method)(
+            f'/api/users/{user.id}/subscribe/'
+        )
+
+    def subscribe_bulk(self, users, method='post'):
+        return getattr(self.client, method)(
+            '/api/users/subscribe/',
+            {'authors': [user.id for user in users]},
+            format='json'
+        )
+
+    def test_subscribe(self):
+        response = self.subscribe(self.users[0])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['id'], self.users[0].id)
+        self.assertTrue(response.json()['is_subscribed'])
+        self.assertEqual(response.json()['recipes_count'], 5)
+        self.assertEqual(self.subscribe(self.users[0]).status_code, 400)
+        self.assertEqual(self.followers(), [1, 0, 0])
+
+        for status_code in (204, 400):
+            response = self.subscribe(self.users[0], 'delete')
+            self.assertEqual(response.status_code, status_code)
+        self.assertEqual(self.followers(), [0, 0, 0])
+
+    def test_subscribe_bulk(self):
+        Subscription.objects.add(self.users[2], [self.users[0].id])
+        authors = [self.users[0], self.users[2]]
+        response = self.subscribe_bulk(authors)
+        self.assertEqual(response.status_code, 200)
+        self.assertCountEqual(
+            [author['id'] for author in response.json()],
+            [author.id for author in authors]
+        )
+        # Повторная подписка пропускается и не меняет счетчики.
+        self.assertEqual(self.subscribe_bulk(authors).status_code, 200)
+        self.assertEqual(self.followers(), [2, 0, 1])
+        self.assertEqual(
+            Subscription.objects.filter(user=self.users[1]).count(),
+            2
+        )
+
+        response = self.subscribe_bulk(authors, 'delete')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.followers(), [1, 0, 0])
+        self.assertFalse(
+            Subscription.objects.filter(user=self.users[1]).exists()
+        )
+
+    def test_subscribe_bulk_missing_author(self):
+        response = self.client.post(
+            '/api/users/subscribe/',
+            {'authors': [self.users[0].id, 10 ** 6]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Subscription.objects.exists())
+
+    def test_self_subscription_rejected(self):
+        self.assertEqual(self.subscribe(self.users[1]).status_code, 400)
+        response = self.subscribe_bulk([self.users[0], self.users[1]])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            Subscription.objects.add(self.users[1], [self.users[1].id]),
+            0
+        )
+        self.assertFalse(Subscription.objects.exists())
+        self.assertEqual(self.followers(), [0, 0, 0])
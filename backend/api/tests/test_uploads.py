@@ -0,0 +1,148 @@
+import os
+import shutil
+import tempfile
+
+from django.test import TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, ImageUpload, Recipe, Tag
+from recipes.tests import create_user
+from .test_fields import image_bytes
+
+URL = '/api/uploads/'
+
+
+@override_settings(JOBS_RUN_INLINE=False)
+class ImageUploadTests(TransactionTestCase):
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        settings_override = override_settings(
+            MEDIA_ROOT=os.path.join(root, 'media'),
+            CHUNKED_UPLOAD_ROOT=os.path.join(root, 'uploads')
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = create_user(0)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.content = image_bytes('PNG')
+        self.ingredient = Ingredient.objects.create(
+            name='мука',
+            measurement_unit='г'
+        )
+        self.tag = Tag.objects.create(
+            name='Обед',
+            color='#49B64E',
+            slug='lunch'
+        )
+
+    def start(self, content=None):
+        response = self.client.post(URL, {
+            'size': len(content or self.content),
+            'content_type': 'image/png',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['token']
+
+    def send(self, token, offset, chunk):
+        return self.client.generic(
+            'PATCH',
+            f'{URL}{token}/',
+            chunk,
+            content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset)
+        )
+
+    def upload(self):
+        token = self.start()
+        middle = len(self.content) // 2
+        for offset, chunk in (
+            (0, self.content[:middle]),
+            (middle, self.content[middle:]),
+        ):
+            response = self.send(token, offset, chunk)
+            self.assertEqual(response.status_code, 200)
+        return token
+
+    def create_recipe(self, token, **data):
+        payload = {
+            'name': 'Рецепт',
+            'text': 'Описание',
+            'cooking_time': 5,
+            'image': token,
+            'tags': [self.tag.id],
+            'ingredients': [{'id': self.ingredient.id, 'amount': 10}],
+        }
+        payload.update(data)
+        return self.client.post('/api/recipes/', payload, format='json')
+
+    def test_resumed_upload_completes(self):
+        token = self.start()
+        response = self.send(token, 0, self.content[:10])
+        self.assertEqual(response.status_code, 200)
+        # После обрыва клиент узнает смещение, с которого продолжить.
+        response = self.client.get(f'{URL}{token}/')
+        self.assertEqual(response.data['offset'], 10)
+        response = self.send(token, 10, self.content[10:])
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['completed'])
+        self.assertEqual(response.data['offset'], len(self.content))
+        upload = ImageUpload.objects.get(token=token)
+        with open(upload.path, 'rb') as file:
+            self.assertEqual(file.read(), self.content)
+
+        response = self.send(token, len(self.content), b'x')
+        self.assertEqual(response.status_code, 400)
+
+    def test_offset_mismatch(self):
+        token = self.start()
+        self.send(token, 0, self.content[:10])
+        for offset in (0, 20):
+            with self.subTest(offset=offset):
+                response = self.send(token, offset, self.content[offset:])
+                self.assertEqual(response.status_code, 409)
+                self.assertEqual(response.data['offset'], 10)
+        self.assertEqual(ImageUpload.objects.get(token=token).offset, 10)
+
+    def test_chunk_beyond_size(self):
+        token = self.start()
+        response = self.send(token, 0, self.content + b'x')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(ImageUpload.objects.get(token=token).offset, 0)
+
+    def test_not_an_image_is_discarded(self):
+        content = b'not an image at all'
+        token = self.start(content)
+        response = self.send(token, 0, content)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ImageUpload.objects.exists())
+        self.assertEqual(self.send(token, 0, content).status_code, 404)
+
+    def test_token_used_once(self):
+        token = self.upload()
+        path = ImageUpload.objects.get(token=token).path
+        # Ошибка в других полях не расходует загрузку.
+        response = self.create_recipe(token, tags=[10 ** 6])
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(ImageUpload.objects.filter(token=token).exists())
+
+        response = self.create_recipe(token)
+        self.assertEqual(response.status_code, 201)
+        recipe = Recipe.objects.get(pk=response.data['id'])
+        with recipe.image.open('rb') as file:
+            self.assertEqual(file.read(), self.content)
+        self.assertFalse(ImageUpload.objects.exists())
+        self.assertFalse(os.path.exists(path))
+
+        response = self.create_recipe(token)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.data)
+
+    def test_foreign_token(self):
+        token = self.upload()
+        self.client.force_authenticate(create_user(1))
+        self.assertEqual(self.send(token, 0, b'x').status_code, 404)
+        self.assertEqual(self.create_recipe(token).status_code, 400)
@@ -3,7 +3,7 @@ from rest_framework.routers import DefaultRouter
 from api.views import (
     TokenObtainFoodgramView, LogoutView,
     UserViewSet, TagViewSet, IngredientViewSet,
-    RecipeViewSet,
+    RecipeViewSet, ImageUploadViewSet,
 )
 
 
@@ -11,6 +11,7 @@ router = DefaultRouter()
 router.register('ingredients', IngredientViewSet)
 router.register('recipes', RecipeViewSet)
 router.register('tags', TagViewSet)
+router.register('uploads', ImageUploadViewSet, basename='uploads')
 router.register('users', UserViewSet)
 
 
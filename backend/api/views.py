@@ -1,8 +1,12 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from rest_framework import filters, status, viewsets, mixins
 from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser
 from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
@@ -10,13 +14,11 @@ from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenViewBase
 
-from .filters import (
-    SpecificAuthorFilterBackend,
-    IsFavouritedFilterBackend,
-    IsInShoppingCartFilterBackend,
-    TagsFilterBackend,
-    IngredientNameFilter,
-)
+from .exports import shopping_list_response
+from .fields import IMAGE_TYPES, is_valid_image
+from .filters import RecipeFilterBackend, IngredientNameFilter
+from .mixins import PrerenderedListMixin
+from .parsers import MultiPartJSONParser
 from .serializers import (
     UserSerializer,
     UserSignUpSerializer,
@@ -26,16 +28,34 @@ from .serializers import (
     IngredientSerializer,
     RecipeSerializer,
     RecipeMinifiedSerializer,
-    UserWithRecipeMinifiedSerializer
+    RecipeIdsSerializer,
+    TrendingRecipeSerializer,
+    ImageUploadSerializer,
+    AuthorIdsSerializer,
+    UserWithRecipeMinifiedSerializer,
+    get_trending_limit,
+)
+from .paginations import (
+    CachedCountPagination,
+    FeedPagination,
+    PageNumberLimitPagination,
+    SubscriptionPagination,
+)
+from .renderers import (
+    CsvExportRenderer,
+    JsonExportRenderer,
+    TxtExportRenderer,
 )
-from .paginations import PageNumberLimitPagination
 from .permissions import (
     AllowAnyIfNotObject,
     IsAuthorOrReadOnly,
     IsAuthenticatedOrOwner,
 )
 from users.models import Subscription, User
-from recipes.models import Ingredient, Tag, Recipe, ShoppingCart, Favorite
+from recipes.models import (
+    Ingredient, Tag, Recipe, ShoppingCart, Favorite,
+    ShoppingListItem, TimelineEntry, ImageUpload,
+)
 
 
 class CreateRetrieveListViewSet(mixins.CreateModelMixin,
@@ -56,6 +76,7 @@ class UserViewSet(CreateRetrieveListViewSet):
     """
 
     queryset = User.objects.all()
+    lookup_value_regex = r'\d+'
     serializer_class = UserSerializer
     pagination_class = PageNumberLimitPagination
     permission_classes = (AllowAnyIfNotObject,)
@@ -98,6 +119,16 @@ class UserViewSet(CreateRetrieveListViewSet):
             status=status.HTTP_400_BAD_REQUEST
         )
 
+    def authors_data(self, request, authors):
+        """
+        To serialize authors through the batched subscriptions path.
+        """
+        return UserWithRecipeMinifiedSerializer(
+            authors,
+            context={'request': request},
+            many=True
+        ).data
+
     @action(
         detail=True,
         methods=['post', 'delete'],
@@ -108,38 +139,66 @@ class UserViewSet(CreateRetrieveListViewSet):
         To manage :model:'users.Subscription' instances.
         """
         user = request.user
-        author = get_object_or_404(User, pk=pk)
 
-        if user == author:
+        if int(pk) == user.id:
             raise ValidationError('Нельзя подписаться на самого себя.')
 
-        subscription = Subscription.objects.filter(user=user, author=author)
-
         if self.request.method == 'POST':
-            if subscription.exists():
-                raise ValidationError(f'Подписка на {author} уже существует.')
-            Subscription(user=user, author=author).save()
-            serializer = UserWithRecipeMinifiedSerializer(
-                author,
-                context={'request': request}
-            )
-            return Response(serializer.data)
-
-        if self.request.method == 'DELETE':
-            if not subscription.exists():
-                raise ValidationError(f'Подписки на {author} не существует.')
-            Subscription.objects.get(user=user, author=author).delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
+            author = get_object_or_404(User, pk=pk)
+            with transaction.atomic():
+                if not Subscription.objects.add(user, [author.id]):
+                    raise ValidationError(
+                        f'Подписка на {author} уже существует.'
+                    )
+                TimelineEntry.objects.follow(user, [author.id])
+            data = self.authors_data(request, User.objects.filter(pk=pk))
+            return Response(data[0])
+
+        with transaction.atomic():
+            if not Subscription.objects.remove(user, [pk]):
+                raise ValidationError(
+                    f'Подписки на автора {pk} не существует.'
+                )
+            TimelineEntry.objects.unfollow(user, [pk])
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
-        return Response(
-            {'': f'{self.request.method}'},
-            status=status.HTTP_400_BAD_REQUEST
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='subscribe',
+        url_name='subscribe-bulk',
+        permission_classes=(IsAuthenticated,)
+    )
+    def subscribe_bulk(self, request):
+        """
+        To follow or unfollow many authors in one transaction.
+        Following is idempotent, existing subscriptions are skipped.
+        """
+        serializer = AuthorIdsSerializer(
+            data=request.data,
+            context={'request': request}
         )
+        serializer.is_valid(raise_exception=True)
+        author_ids = serializer.validated_data['authors']
+
+        with transaction.atomic():
+            if self.request.method == 'DELETE':
+                Subscription.objects.remove(request.user, author_ids)
+                TimelineEntry.objects.unfollow(request.user, author_ids)
+                return Response(status=status.HTTP_204_NO_CONTENT)
+
+            Subscription.objects.add(request.user, author_ids)
+            TimelineEntry.objects.follow(request.user, author_ids)
+        return Response(self.authors_data(
+            request,
+            User.objects.filter(pk__in=author_ids)
+        ))
 
     @action(
         detail=False,
         methods=['get'],
-        permission_classes=(IsAuthenticated,)
+        permission_classes=(IsAuthenticated,),
+        pagination_class=SubscriptionPagination
     )
     def subscriptions(self, request):
         user_subscriptions = User.objects.filter(
@@ -156,7 +215,7 @@ class UserViewSet(CreateRetrieveListViewSet):
             return self.get_paginated_response(serializer.data)
 
         serializer = UserWithRecipeMinifiedSerializer(
-            page,
+            user_subscriptions,
             context={'request': request},
             many=True
         )
@@ -188,7 +247,7 @@ class TokenObtainFoodgramView(TokenViewBase):
     serializer_class = FoodgramTokenObtainSerializer
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(PrerenderedListMixin, viewsets.ReadOnlyModelViewSet):
     """
     This viewset only allows to present
     instances of :model:'recipes.Tag'.
@@ -200,7 +259,8 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(PrerenderedListMixin,
+                        viewsets.ReadOnlyModelViewSet):
     """
     To get :model:'recipes.Ingredient' instances.
     To search by name use 'search' query param.
@@ -222,21 +282,26 @@ class RecipeViewSet(viewsets.ModelViewSet):
     """
 
     queryset = Recipe.objects.all().order_by('-pub_date')
+    lookup_value_regex = r'\d+'
     serializer_class = RecipeSerializer
-    pagination_class = PageNumberLimitPagination
+    pagination_class = CachedCountPagination
+    # Изображение можно прислать файлом: JSON рецепта в части 'data',
+    # файл в части 'image'.
+    parser_classes = (JSONParser, MultiPartJSONParser)
     permission_classes = (IsAuthorOrReadOnly,)
-    filter_backends = (
-        SpecificAuthorFilterBackend,
-        IsFavouritedFilterBackend,
-        IsInShoppingCartFilterBackend,
-        TagsFilterBackend,
-    )
+    filter_backends = (RecipeFilterBackend, filters.OrderingFilter)
     filterset_fields = (
         'author',
         'is_favorited',
         'is_in_shopping_cart',
         'tags',
     )
+    ordering_fields = ('pub_date', 'favorites_count', 'in_carts_count',)
+
+    def get_queryset(self):
+        return super().get_queryset().with_related().with_user_flags(
+            self.request.user
+        )
 
     @action(
         detail=True,
@@ -246,28 +311,21 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def favorite(self, request, pk=None):
 
         user = request.user
-        recipe = get_object_or_404(Recipe, pk=pk)
-        query = Favorite.objects.filter(user=user, recipe=recipe)
 
         if self.request.method == 'POST':
-            if query.exists():
+            recipe = get_object_or_404(Recipe, pk=pk)
+            if not Favorite.objects.add(user, [recipe.id]):
                 raise ValidationError(f'{recipe} уже в избранном.')
-            Favorite(user=user, recipe=recipe).save()
             serializer = RecipeMinifiedSerializer(
                 recipe,
                 context={'request': request}
             )
             return Response(serializer.data)
 
-        if self.request.method == 'DELETE':
-            if not query.exists():
-                raise ValidationError(f'{recipe} отсутствует в избранном.')
-            Favorite.objects.get(user=user, recipe=recipe).delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        return Response(
-            {'': f'{self.request.method}'},
-            status=status.HTTP_400_BAD_REQUEST
-        )
+        if not Favorite.objects.remove(user, [pk]):
+            get_object_or_404(Recipe, pk=pk)
+            raise ValidationError(f'Рецепта {pk} нет в избранном.')
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
         detail=True,
@@ -277,54 +335,236 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def shopping_cart(self, request, pk=None):
 
         user = request.user
-        recipe = get_object_or_404(Recipe, pk=pk)
-        shopping_cart = ShoppingCart.objects.get_or_create(user=user)
-        query = ShoppingCart.objects.filter(user=user, recipe=recipe)
 
         if self.request.method == 'POST':
-            if query.exists():
-                raise ValidationError(f'{recipe} уже в списке покупок.')
-            shopping_cart[0].recipe.add(recipe)
+            recipe = get_object_or_404(Recipe, pk=pk)
+            with transaction.atomic():
+                if not ShoppingCart.objects.add(user, [recipe.id]):
+                    raise ValidationError(f'{recipe} уже в списке покупок.')
+                ShoppingListItem.objects.add_recipe(user, recipe)
             serializer = RecipeMinifiedSerializer(
                 recipe,
                 context={'request': request}
             )
             return Response(serializer.data)
 
-        if self.request.method == 'DELETE':
-            if not query.exists():
+        with transaction.atomic():
+            if not ShoppingCart.objects.remove(user, [pk]):
+                get_object_or_404(Recipe, pk=pk)
                 raise ValidationError(
-                    f'{recipe} отсутствует в Вашем списке покупок.'
+                    f'Рецепта {pk} нет в Вашем списке покупок.'
                 )
-            shopping_cart[0].recipe.remove(recipe)
+            ShoppingListItem.objects.remove_recipe(user, pk)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def bulk_response(self, request, manager):
+        """
+        To add or remove many recipes with one statement.
+        Adding is idempotent, already added recipes are skipped.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipes = serializer.validated_data['recipes']
+        user = request.user
+
+        with transaction.atomic():
+            if self.request.method == 'DELETE':
+                changed = manager.remove(user, [
+                    recipe.id for recipe in recipes
+                ])
+            else:
+                changed = manager.add(user, [
+                    recipe.id for recipe in recipes
+                ])
+            if changed and manager.model is ShoppingCart:
+                ShoppingListItem.objects.rebuild([user.id])
+
+        if self.request.method == 'DELETE':
             return Response(status=status.HTTP_204_NO_CONTENT)
-        return Response(status=status.HTTP_400_BAD_REQUEST)
+        return Response(RecipeMinifiedSerializer(
+            recipes,
+            many=True,
+            context={'request': request}
+        ).data)
 
     @action(
         detail=False,
-        methods=['get'],
+        methods=['post', 'delete'],
+        url_path='favorite',
+        url_name='favorite-bulk',
         permission_classes=(IsAuthenticated,)
     )
-    def download_shopping_cart(self, request):
+    def favorite_bulk(self, request):
+        return self.bulk_response(request, Favorite.objects)
 
-        user = request.user
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='shopping_cart',
+        url_name='shopping-cart-bulk',
+        permission_classes=(IsAuthenticated,)
+    )
+    def shopping_cart_bulk(self, request):
+        return self.bulk_response(request, ShoppingCart.objects)
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=(IsAuthenticated,),
+        pagination_class=FeedPagination
+    )
+    def feed(self, request):
+        """
+        To get recipes of followed authors, newest first.
+        Pages are linked by 'next' cursor.
+        """
+        page = self.paginate_queryset(self.get_queryset())
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
-        shopping_recipes = Recipe.objects.filter(
-            recipes__user=user
+    @action(detail=False, methods=['get'], permission_classes=(AllowAny,))
+    def trending(self, request):
+        """
+        To get recipes with the highest time-decayed score of
+        recent favorites and shopping cart additions.
+        Size of the list is set by 'limit' query param.
+        """
+        recipes = Recipe.objects.trending().with_related().with_user_flags(
+            request.user
+        )[:get_trending_limit(request)]
+        serializer = TrendingRecipeSerializer(
+            recipes,
+            many=True,
+            context={'request': request}
         )
-        ingredients = shopping_recipes.values_list(
-            'amount__ingredient__name',
-            'amount__ingredient__measurement_unit'
-        ).order_by('amount__ingredient__name')
-        total = ingredients.annotate(
-            amount=Sum('amount__amount')
+        return Response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=(
+            TxtExportRenderer,
+            CsvExportRenderer,
+            JsonExportRenderer,
         )
+    )
+    def download_shopping_cart(self, request):
+        """
+        To export shopping list. Formats: '?format=txt|csv|json'.
+        """
+        renderer = request.accepted_renderer
+        return shopping_list_response(
+            request,
+            renderer.format,
+            f'{renderer.media_type}; charset={renderer.charset}'
+        )
+
+
+class ImageUploadViewSet(mixins.CreateModelMixin,
+                         mixins.RetrieveModelMixin,
+                         mixins.DestroyModelMixin,
+                         viewsets.GenericViewSet):
+    """
+    To upload an image by chunks. POST with 'size' and 'content_type'
+    returns 'token'. PATCH to uploads/<token>/ sends the next chunk
+    as request body, its position is set by 'Upload-Offset' header.
+    GET returns 'offset' to resume an interrupted upload from.
+    Token of completed upload is accepted by 'image' field of recipes.
+    """
+
+    serializer_class = ImageUploadSerializer
+    permission_classes = (IsAuthenticated,)
+    lookup_field = 'token'
+    lookup_value_regex = (
+        r'[0-9a-f]{8}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{12}'
+    )
 
-        shopping_cart = 'Список покупок:'
-        for ingr in total:
-            shopping_cart += f'\n{ingr[0]}: {ingr[2]} {ingr[1]}'
+    def get_queryset(self):
+        return ImageUpload.objects.filter(user=self.request.user)
 
-        return HttpResponse(
-            shopping_cart,
-            content_type='text/plain'
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    def perform_destroy(self, instance):
+        instance.discard()
+
+    def partial_update(self, request, token=None):
+        try:
+            offset = int(request.META['HTTP_UPLOAD_OFFSET'])
+            length = int(request.META['CONTENT_LENGTH'])
+        except (KeyError, ValueError):
+            raise ValidationError(
+                'Нужны заголовки Upload-Offset и Content-Length.'
+            )
+        if length > settings.CHUNKED_UPLOAD_MAX_CHUNK_SIZE:
+            raise ValidationError(
+                'Размер части превышает '
+                f'{settings.CHUNKED_UPLOAD_MAX_CHUNK_SIZE} байт.'
+            )
+
+        upload = self.get_object()
+        if upload.completed:
+            raise ValidationError('Загрузка уже завершена.')
+        if offset != upload.offset:
+            return self.offset_conflict(upload)
+        if offset + length > upload.size:
+            raise ValidationError('Данные превышают размер загрузки.')
+
+        # Тело запроса читается до блокировки строки загрузки:
+        # медленный клиент не держит транзакцию открытой.
+        with self.spool_chunk(request, length) as chunk:
+            with transaction.atomic():
+                upload = get_object_or_404(
+                    self.get_queryset().select_for_update(),
+                    token=token
+                )
+                # Загрузку продолжили параллельным запросом.
+                if offset != upload.offset:
+                    return self.offset_conflict(upload)
+                upload.write(offset, chunk, chunk.size)
+
+        if upload.completed:
+            pillow_format, _ = IMAGE_TYPES[upload.content_type]
+            with open(upload.path, 'rb') as file:
+                valid = is_valid_image(file, pillow_format)
+            if not valid:
+                upload.discard()
+                raise ValidationError(
+                    'Загруженный файл не является изображением '
+                    f'{upload.content_type}.'
+                )
+        return Response(self.get_serializer(upload).data)
+
+    def offset_conflict(self, upload):
+        # Клиент отстал или опередил сервер: возвращаем смещение,
+        # с которого нужно продолжить.
+        return Response(
+            self.get_serializer(upload).data,
+            status=status.HTTP_409_CONFLICT
         )
+
+    @staticmethod
+    def spool_chunk(request, length):
+        """
+        To read up to length bytes of the request body into a
+        temporary file, which is kept in memory while it is small.
+        """
+        chunk = File(SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE,
+            dir=settings.FILE_UPLOAD_TEMP_DIR
+        ))
+        try:
+            remaining = length
+            while remaining:
+                data = request.read(min(remaining, 64 * 1024))
+                if not data:
+                    break
+                chunk.write(data)
+                remaining -= len(data)
+        except Exception:
+            chunk.close()
+            raise
+        chunk.size = length - remaining
+        chunk.seek(0)
+        return chunk
@@ -20,6 +20,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'corsheaders',
     'rest_framework_simplejwt',
@@ -27,6 +28,7 @@ INSTALLED_APPS = [
     'api.apps.ApiConfig',
     'recipes.apps.RecipesConfig',
     'users.apps.UsersConfig',
+    'jobs.apps.JobsConfig',
 ]
 
 MIDDLEWARE = [
@@ -73,6 +75,33 @@ DATABASES = {
 }
 
 
+# Кеш общий для всех процессов: в нем хранятся версии таблиц,
+# по которым воркеры сбрасывают свои индексы и кеши. Файловый кеш
+# по умолчанию виден только внутри одного контейнера, в docker-compose
+# используется кеш в базе данных ('manage.py createcachetable').
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.filebased.FileBasedCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='/tmp/foodgram_cache'),
+    },
+    # Готовые списки покупок, ключ содержит версию корзины.
+    # LocMemCache вытесняет давно не используемые записи (LRU).
+    'exports': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'exports',
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('EXPORTS_CACHE_MAX_ENTRIES', default=1000)),
+        },
+    },
+}
+
+# Тесты выполняются с кешами в памяти, см. foodgram/test_runner.py.
+TEST_RUNNER = 'foodgram.test_runner.TestRunner'
+
+
 AUTH_USER_MODEL = 'users.User'
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -108,6 +137,42 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Файлы называются по хешу SHA-256 содержимого и раскладываются
+# по каталогам 'ab/cd/', одинаковые загрузки хранятся один раз.
+DEFAULT_FILE_STORAGE = 'recipes.storage.ContentAddressedStorage'
+
+# Максимальный размер загружаемого изображения рецепта в байтах.
+IMAGE_UPLOAD_MAX_SIZE = int(
+    os.getenv('IMAGE_UPLOAD_MAX_SIZE', default=5 * 1024 * 1024)
+)
+
+# Очередь задач в базе данных, см. 'manage.py run_workers'.
+# С JOBS_RUN_INLINE задачи выполняются сразу после коммита
+# в процессе запроса, но повторы упавших задач и задачи с
+# задержкой по-прежнему выполняют воркеры.
+JOBS_RUN_INLINE = os.getenv(
+    'JOBS_RUN_INLINE', default='False'
+).lower() in ('1', 'true', 'yes')
+JOBS_WORKER_PROCESSES = int(os.getenv('JOBS_WORKER_PROCESSES', default=2))
+JOBS_VISIBILITY_TIMEOUT = int(
+    os.getenv('JOBS_VISIBILITY_TIMEOUT', default=300)
+)
+JOBS_MAX_ATTEMPTS = int(os.getenv('JOBS_MAX_ATTEMPTS', default=5))
+JOBS_RETRY_DELAY = int(os.getenv('JOBS_RETRY_DELAY', default=10))
+
+# Загрузка изображений по частям: каталог незавершенных загрузок,
+# максимальный размер части и время жизни загрузки в часах.
+CHUNKED_UPLOAD_ROOT = os.getenv(
+    'CHUNKED_UPLOAD_ROOT',
+    default='/tmp/foodgram_uploads'
+)
+CHUNKED_UPLOAD_MAX_CHUNK_SIZE = int(
+    os.getenv('CHUNKED_UPLOAD_MAX_CHUNK_SIZE', default=1024 * 1024)
+)
+CHUNKED_UPLOAD_EXPIRE_HOURS = int(
+    os.getenv('CHUNKED_UPLOAD_EXPIRE_HOURS', default=24)
+)
+
 
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
@@ -121,6 +186,45 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 6,
 }
 
+# Время жизни кеша COUNT(*) для пагинации рецептов в секундах
+# и размер таблицы, начиная с которого используется оценка reltuples.
+PAGINATION_COUNT_CACHE_TIMEOUT = int(
+    os.getenv('PAGINATION_COUNT_CACHE_TIMEOUT', default=60)
+)
+PAGINATION_COUNT_ESTIMATE_THRESHOLD = int(
+    os.getenv('PAGINATION_COUNT_ESTIMATE_THRESHOLD', default=100000)
+)
+
+# Популярные рецепты: период полураспада счета в часах, окно
+# активности в днях и веса добавления в избранное и в корзину.
+TRENDING_HALF_LIFE_HOURS = float(
+    os.getenv('TRENDING_HALF_LIFE_HOURS', default=24)
+)
+TRENDING_WINDOW_DAYS = int(os.getenv('TRENDING_WINDOW_DAYS', default=7))
+TRENDING_FAVORITE_WEIGHT = 1.0
+TRENDING_CART_WEIGHT = 1.0
+
+# Лента подписок: рецепты авторов, у которых подписчиков больше
+# FEED_FANOUT_MAX_FOLLOWERS, не рассылаются по лентам, а
+# подмешиваются при чтении.
+FEED_FANOUT_MAX_FOLLOWERS = int(
+    os.getenv('FEED_FANOUT_MAX_FOLLOWERS', default=10000)
+)
+FEED_FANOUT_BATCH_SIZE = int(
+    os.getenv('FEED_FANOUT_BATCH_SIZE', default=1000)
+)
+FEED_BACKFILL_SIZE = int(os.getenv('FEED_BACKFILL_SIZE', default=50))
+
+# Поиск ингредиентов по имени: 'memory' - индекс в памяти воркера,
+# 'database' - ранжированный поиск средствами PostgreSQL.
+INGREDIENT_SEARCH_BACKEND = os.getenv(
+    'INGREDIENT_SEARCH_BACKEND', default='memory'
+)
+# Максимальное количество ингредиентов в ответе на поиск по имени.
+INGREDIENT_SEARCH_LIMIT = int(
+    os.getenv('INGREDIENT_SEARCH_LIMIT', default=50)
+)
+
 
 SIMPLE_JWT = {
     # Авторизация - по токену. Девалидируем токен вручную.
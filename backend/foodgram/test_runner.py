@@ -0,0 +1,40 @@
+import unittest
+
+from django.conf import settings
+from django.core.cache import caches
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """
+    To run tests with in-memory caches, which are cleared before
+    every test: table versions, cached counts and exports
+    do not leak between tests and test runs.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.caches_override = override_settings(CACHES={
+            alias: {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': f'test-{alias}',
+            }
+            for alias in settings.CACHES
+        })
+        self.caches_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.caches_override.disable()
+        super().teardown_test_environment(**kwargs)
+
+    def get_resultclass(self):
+        base = super().get_resultclass() or unittest.TextTestResult
+
+        class ClearingCachesResult(base):
+            def startTest(self, test):
+                for cache in caches.all():
+                    cache.clear()
+                super().startTest(test)
+
+        return ClearingCachesResult
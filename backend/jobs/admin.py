@@ -0,0 +1,18 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+class JobAdmin(admin.ModelAdmin):
+    """
+    To watch jobs against status and function.
+    """
+
+    list_display = (
+        'name', 'status', 'attempts', 'available_at', 'finished_at',
+    )
+    list_filter = ('status', 'name',)
+    readonly_fields = ('lease', 'created', 'finished_at',)
+
+
+admin.site.register(Job, JobAdmin)
@@ -0,0 +1,70 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from jobs.worker import handle_stop_signals, init_pool_worker, run_worker
+
+
+class Command(BaseCommand):
+    help = 'Запуск воркеров очереди задач'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=settings.JOBS_WORKER_PROCESSES,
+            help='Количество процессов-воркеров'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10,
+            help='Сколько задач воркер берет за раз'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Пауза в секундах, если очередь пуста'
+        )
+        parser.add_argument(
+            '--visibility-timeout',
+            type=int,
+            default=settings.JOBS_VISIBILITY_TIMEOUT,
+            help='Через сколько секунд задачу упавшего воркера возьмет другой'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выполнить доступные задачи и завершиться'
+        )
+
+    def handle(self, **options):
+        worker_options = (
+            options['batch_size'],
+            options['poll_interval'],
+            options['visibility_timeout'],
+            options['once'],
+        )
+        # SIGTERM и SIGINT родителя останавливают все процессы пула:
+        # воркеры доделывают текущую задачу и завершаются.
+        stop = multiprocessing.Event()
+        handle_stop_signals(stop)
+        # Соединения с базой не должны наследоваться дочерними процессами.
+        connections.close_all()
+        with ProcessPoolExecutor(
+            options['processes'],
+            initializer=init_pool_worker,
+            initargs=(stop,)
+        ) as pool:
+            futures = [
+                pool.submit(run_worker, *worker_options)
+                for _ in range(options['processes'])
+            ]
+            processed = sum(future.result() for future in futures)
+        self.stdout.write(self.style.SUCCESS(
+            f'Выполнено задач: {processed}.'
+        ))
@@ -0,0 +1,199 @@
+import json
+import traceback
+import uuid
+from contextlib import nullcontext
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+
+class JobQuerySet(models.QuerySet):
+    """
+    Queryset of :model:'jobs.Job' with enqueueing and claiming
+    of jobs by workers.
+    """
+
+    def enqueue(self, name, *args, delay=0, **kwargs):
+        """
+        To put a call of function by dotted path 'name' to the queue.
+        The job is visible to workers after the current transaction
+        is committed. With JOBS_RUN_INLINE the job is run right
+        after commit in the current process.
+        """
+        now = timezone.now()
+        job = self.model(
+            name=name,
+            args=json.dumps(args),
+            kwargs=json.dumps(kwargs),
+            max_attempts=settings.JOBS_MAX_ATTEMPTS,
+            available_at=now + timedelta(seconds=delay)
+        )
+        if settings.JOBS_RUN_INLINE:
+            # Задача сразу занята текущим процессом. Если она упадет,
+            # ее повторят воркеры.
+            job.status = self.model.RUNNING
+            job.lease = uuid.uuid4()
+            job.attempts = 1
+            job.available_at = now + timedelta(
+                seconds=settings.JOBS_VISIBILITY_TIMEOUT
+            )
+            job.save()
+            transaction.on_commit(job.run)
+        else:
+            job.save()
+        return job
+
+    def claimable(self, now):
+        # Задача доступна, если подошло ее время, или если истек
+        # таймаут видимости воркера, который ее взял.
+        return self.filter(
+            Q(status=self.model.QUEUED)
+            | Q(
+                status=self.model.RUNNING,
+                attempts__lt=F('max_attempts')
+            ),
+            available_at__lte=now
+        )
+
+    def claim(self, limit, visibility_timeout):
+        """
+        To take up to limit available jobs for visibility_timeout
+        seconds. On PostgreSQL rows locked by other workers are
+        skipped. Every claim sets a new lease, so a conditional
+        UPDATE lets only one worker take a job on any database.
+        """
+        now = timezone.now()
+        self.filter(
+            status=self.model.RUNNING,
+            attempts__gte=F('max_attempts'),
+            available_at__lte=now
+        ).update(
+            status=self.model.FAILED,
+            finished_at=now,
+            last_error='Истек таймаут видимости.'
+        )
+
+        lease = uuid.uuid4()
+        # В SQLite SELECT и UPDATE в одной транзакции приводят
+        # к взаимной блокировке воркеров, там хватает условного UPDATE.
+        skip_locked = connection.features.has_select_for_update_skip_locked
+        with transaction.atomic() if skip_locked else nullcontext():
+            job_ids = list(
+                self.claimable(now).select_for_update(
+                    skip_locked=True
+                ).order_by('available_at').values_list('id', flat=True)[
+                    :limit
+                ]
+            )
+            self.filter(id__in=job_ids).claimable(now).update(
+                status=self.model.RUNNING,
+                lease=lease,
+                attempts=F('attempts') + 1,
+                available_at=now + timedelta(seconds=visibility_timeout)
+            )
+        return list(self.filter(lease=lease).order_by('available_at'))
+
+    def finished_before(self, moment):
+        return self.filter(
+            status__in=(self.model.DONE, self.model.FAILED),
+            finished_at__lt=moment
+        )
+
+
+class Job(models.Model):
+    """
+    Call of a function by dotted path, to be run by
+    'manage.py run_workers' outside of the request.
+    """
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField(max_length=200, verbose_name='Функция')
+    args = models.TextField(default='[]', verbose_name='Аргументы')
+    kwargs = models.TextField(
+        default='{}',
+        verbose_name='Именованные аргументы'
+    )
+    status = models.CharField(
+        max_length=16,
+        choices=STATUSES,
+        default=QUEUED,
+        verbose_name='Статус'
+    )
+    attempts = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Попыток'
+    )
+    max_attempts = models.PositiveIntegerField(verbose_name='Макс. попыток')
+    # Для задачи в очереди - время, с которого ее можно взять,
+    # для выполняемой - время, до которого она занята воркером.
+    available_at = models.DateTimeField(verbose_name='Доступна с')
+    lease = models.UUIDField(null=True, blank=True, editable=False)
+    last_error = models.TextField(blank=True, verbose_name='Ошибка')
+    created = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    objects = JobQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['status', 'available_at'],
+                name='job_status_available_idx'
+            ),
+        ]
+        verbose_name = 'Задача'
+        verbose_name_plural = 'Задачи'
+
+    def __str__(self):
+        return f'{self.name} ({self.get_status_display()})'
+
+    def run(self):
+        """
+        To call the function in a transaction. Failed job is
+        retried with exponential backoff until max_attempts.
+        Returns True on success.
+        """
+        try:
+            function = import_string(self.name)
+            with transaction.atomic():
+                function(*json.loads(self.args), **json.loads(self.kwargs))
+        except Exception:
+            self.fail(traceback.format_exc())
+            return False
+        self.finish(status=self.DONE)
+        return True
+
+    def fail(self, error):
+        if self.attempts >= self.max_attempts:
+            self.finish(status=self.FAILED, last_error=error)
+            return
+        delay = settings.JOBS_RETRY_DELAY * 2 ** (self.attempts - 1)
+        self.finish(
+            status=self.QUEUED,
+            last_error=error,
+            available_at=timezone.now() + timedelta(seconds=delay),
+            finished_at=None
+        )
+
+    def finish(self, **fields):
+        # Обновление не применяется, если таймаут видимости истек
+        # и задачу уже взял другой воркер.
+        fields.setdefault('finished_at', timezone.now())
+        Job.objects.filter(pk=self.pk, lease=self.lease).update(
+            lease=None,
+            **fields
+        )
@@ -0,0 +1,164 @@
+import os
+import signal
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from django.db import transaction
+from django.test import (
+    SimpleTestCase, TestCase, TransactionTestCase, override_settings,
+)
+from django.utils import timezone
+
+from . import worker
+from .models import Job
+
+calls = []
+
+
+def record(value):
+    calls.append(value)
+
+
+def explode():
+    raise ValueError('explode')
+
+
+def stop_worker():
+    worker.stop_event.set()
+
+
+@override_settings(JOBS_RUN_INLINE=False, JOBS_MAX_ATTEMPTS=2)
+class JobLeaseTests(TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def expire(self, job):
+        Job.objects.filter(pk=job.pk).update(
+            available_at=timezone.now() - timedelta(seconds=1)
+        )
+
+    def test_claimed_job_is_not_claimed_again(self):
+        Job.objects.enqueue('jobs.tests.record', 1)
+        first = Job.objects.claim(10, 60)
+        self.assertEqual(len(first), 1)
+        self.assertEqual(first[0].status, Job.RUNNING)
+        self.assertEqual(first[0].attempts, 1)
+        self.assertEqual(Job.objects.claim(10, 60), [])
+
+    def test_delayed_job_is_not_claimed(self):
+        Job.objects.enqueue('jobs.tests.record', 1, delay=60)
+        self.assertEqual(Job.objects.claim(10, 60), [])
+
+    def test_expired_lease_is_reclaimed(self):
+        Job.objects.enqueue('jobs.tests.record', 1)
+        stale = Job.objects.claim(10, 60)[0]
+        self.expire(stale)
+        fresh = Job.objects.claim(10, 60)[0]
+        self.assertEqual(fresh.pk, stale.pk)
+        self.assertNotEqual(fresh.lease, stale.lease)
+        self.assertEqual(fresh.attempts, 2)
+
+        # Воркер с истекшей арендой не перезаписывает результат.
+        stale.finish(status=Job.FAILED)
+        self.assertEqual(Job.objects.get(pk=fresh.pk).status, Job.RUNNING)
+        self.assertTrue(fresh.run())
+        job = Job.objects.get(pk=fresh.pk)
+        self.assertEqual(job.status, Job.DONE)
+        self.assertIsNone(job.lease)
+        self.assertEqual(calls, [1])
+
+    def test_expired_lease_at_max_attempts_fails(self):
+        Job.objects.enqueue('jobs.tests.record', 1)
+        for _ in range(2):
+            job = Job.objects.claim(10, 60)[0]
+            self.expire(job)
+        self.assertEqual(Job.objects.claim(10, 60), [])
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.FAILED)
+
+    def test_failed_job_is_retried_with_backoff(self):
+        Job.objects.enqueue('jobs.tests.explode')
+        job = Job.objects.claim(10, 60)[0]
+        self.assertFalse(job.run())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertGreater(job.available_at, timezone.now())
+        self.assertIn('explode', job.last_error)
+
+        self.expire(job)
+        job = Job.objects.claim(10, 60)[0]
+        self.assertFalse(job.run())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 2)
+
+
+@override_settings(JOBS_RUN_INLINE=True)
+class InlineJobTests(TransactionTestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def test_run_after_commit(self):
+        with transaction.atomic():
+            job = Job.objects.enqueue('jobs.tests.record', 1)
+            self.assertEqual(calls, [])
+        self.assertEqual(calls, [1])
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.DONE)
+
+    def test_not_run_on_rollback(self):
+        try:
+            with transaction.atomic():
+                Job.objects.enqueue('jobs.tests.record', 1)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual(calls, [])
+        self.assertFalse(Job.objects.exists())
+
+
+@override_settings(JOBS_RUN_INLINE=False)
+class WorkerStopTests(TransactionTestCase):
+
+    def setUp(self):
+        calls.clear()
+        patcher = mock.patch('jobs.worker.stop_event', threading.Event())
+        self.stop = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_stopped_worker_claims_nothing(self):
+        Job.objects.enqueue('jobs.tests.record', 1)
+        self.stop.set()
+        self.assertEqual(worker.run_worker(10, 0, 60), 0)
+        self.assertEqual(Job.objects.get().status, Job.QUEUED)
+
+    def test_worker_finishes_current_job_and_stops(self):
+        Job.objects.enqueue('jobs.tests.stop_worker')
+        Job.objects.enqueue('jobs.tests.record', 1)
+        self.assertEqual(worker.run_worker(10, 0, 60), 1)
+        self.assertEqual(calls, [])
+        statuses = list(
+            Job.objects.order_by('id').values_list('status', flat=True)
+        )
+        # Невыполненная задача вернется в очередь после таймаута.
+        self.assertEqual(statuses, [Job.DONE, Job.RUNNING])
+
+    def test_once(self):
+        Job.objects.enqueue('jobs.tests.record', 1)
+        self.assertEqual(worker.run_worker(10, 0, 60, once=True), 1)
+        self.assertEqual(calls, [1])
+        self.assertFalse(self.stop.is_set())
+
+
+class StopSignalTests(SimpleTestCase):
+
+    def test_signals_set_event(self):
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            self.addCleanup(signal.signal, signum, signal.getsignal(signum))
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            with self.subTest(signum=signum):
+                event = threading.Event()
+                worker.handle_stop_signals(event)
+                os.kill(os.getpid(), signum)
+                self.assertTrue(event.wait(1))
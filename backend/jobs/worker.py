@@ -0,0 +1,63 @@
+import signal
+import threading
+
+from django.db import DatabaseError, connections
+
+from .models import Job
+
+# Событие остановки, общее для процессов пула 'manage.py run_workers'.
+stop_event = None
+
+
+def handle_stop_signals(event):
+    """To set event on SIGTERM and SIGINT."""
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *args: event.set())
+
+
+def init_pool_worker(event):
+    """
+    To share the stop event of the parent with a pool process.
+    SIGINT from the terminal is handled by the parent only.
+    """
+    global stop_event
+    stop_event = event
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda *args: event.set())
+
+
+def run_worker(batch_size, poll_interval, visibility_timeout, once=False):
+    """
+    To claim and run jobs until stopped. With once the worker
+    exits when no job is available. Returns the number of run jobs.
+    """
+    stop = stop_event
+    if stop is None:
+        # Воркер запущен вне пула и сам обрабатывает сигналы.
+        stop = threading.Event()
+        handle_stop_signals(stop)
+
+    processed = 0
+    try:
+        while not stop.is_set():
+            try:
+                jobs = Job.objects.claim(batch_size, visibility_timeout)
+            except DatabaseError:
+                # База недоступна или занята: повторим после паузы.
+                connections.close_all()
+                stop.wait(poll_interval)
+                continue
+            for job in jobs:
+                if stop.is_set():
+                    # Невыполненные задачи вернутся в очередь
+                    # по истечении таймаута видимости.
+                    break
+                job.run()
+                processed += 1
+            if not jobs:
+                if once:
+                    break
+                stop.wait(poll_interval)
+    finally:
+        connections.close_all()
+    return processed
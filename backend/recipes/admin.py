@@ -2,7 +2,7 @@ from django.contrib import admin
 
 from .models import (
     Ingredient, Tag, Recipe, IngredientAmountInRecipe,
-    Favorite, ShoppingCart
+    Favorite, MediaFile, ShoppingCart, ShoppingListItem
 )
 
 
@@ -27,7 +27,7 @@ class RecipeAdmin(admin.ModelAdmin):
     inlines = (IngredientRecipeInLine,)
 
     def favorite(self, obj):
-        return obj.favourite.count()
+        return obj.favorites_count
 
 
 class IngredientAdmin(admin.ModelAdmin):
@@ -41,6 +41,8 @@ class IngredientAdmin(admin.ModelAdmin):
 admin.site.register(Ingredient, IngredientAdmin)
 admin.site.register(IngredientAmountInRecipe)
 admin.site.register(Favorite)
+admin.site.register(MediaFile)
 admin.site.register(Recipe, RecipeAdmin)
 admin.site.register(ShoppingCart)
+admin.site.register(ShoppingListItem)
 admin.site.register(Tag)
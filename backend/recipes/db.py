@@ -0,0 +1,63 @@
+from django.db import connection
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def insert_ignoring_conflicts(model, columns, select, params):
+    """
+    To run 'INSERT INTO <model table> (columns) <select>
+    ON CONFLICT DO NOTHING' as a single statement.
+    Returns the number of inserted rows.
+    """
+    quote_name = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote_name(model._meta.db_table)} '
+            f'({", ".join(map(quote_name, columns))}) '
+            f'{select} ON CONFLICT DO NOTHING',
+            params
+        )
+        return cursor.rowcount
+
+
+def insert_or_add(model, columns, conflict_columns, field, select, params):
+    """
+    To run 'INSERT INTO <model table> (columns) <select>
+    ON CONFLICT (conflict_columns) DO UPDATE SET field = field + new field'
+    as a single statement: the conflicting row is locked and updated.
+    """
+    quote_name = connection.ops.quote_name
+    table = quote_name(model._meta.db_table)
+    field = quote_name(field)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} '
+            f'({", ".join(map(quote_name, columns))}) '
+            f'{select} '
+            f'ON CONFLICT ({", ".join(map(quote_name, conflict_columns))}) '
+            f'DO UPDATE SET {field} = {table}.{field} + EXCLUDED.{field}',
+            params
+        )
+
+
+def placeholders(values):
+    """To make '%s, %s, ...' for values of IN (...) clause."""
+    return ', '.join(['%s'] * len(values))
+
+
+def count_subquery(queryset, field):
+    """
+    To count rows of queryset which 'field' refers to the outer row.
+    Usage: annotate() or update() of the referred model.
+    """
+    return Coalesce(
+        Subquery(
+            queryset.filter(
+                **{field: OuterRef('pk')}
+            ).order_by().values(field).annotate(
+                count=Count('pk')
+            ).values('count'),
+            output_field=IntegerField()
+        ),
+        0
+    )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import ImageUpload
+
+
+class Command(BaseCommand):
+    help = 'Удаление незавершенных и неиспользованных загрузок изображений'
+
+    def handle(self, **kwargs):
+        deleted = ImageUpload.objects.expired().discard()
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено загрузок: {deleted}.'
+        ))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from recipes.models import Recipe
+from recipes.renditions import create_renditions
+
+
+class Command(BaseCommand):
+    help = 'Создание уменьшенных копий изображений рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересоздать копии для всех рецептов'
+        )
+
+    def handle(self, **kwargs):
+        recipes = Recipe.objects.exclude(image='')
+        if not kwargs['all']:
+            recipes = recipes.exclude(rendition_source=F('image'))
+        created = 0
+        for recipe in recipes.iterator():
+            try:
+                create_renditions(recipe)
+            except (OSError, ValueError) as error:
+                self.stderr.write(f'{recipe.image.name}: {error}')
+                continue
+            created += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано рецептов: {created}.'
+        ))
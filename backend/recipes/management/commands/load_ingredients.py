@@ -3,6 +3,7 @@ import csv
 from django.conf import settings
 from django.core.management.base import BaseCommand
 from recipes.models import Ingredient
+from recipes.versions import bump_table_version
 
 
 class Command(BaseCommand):
@@ -21,6 +22,8 @@ class Command(BaseCommand):
                     name=row[0],
                     measurement_unit=row[1]
                 )
+        # Индексы ингредиентов в воркерах будут перестроены.
+        bump_table_version(Ingredient)
         self.stdout.write(self.style.SUCCESS(
                           'Ингредиенты успешно загружены в БД.'
                           ))
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = 'Пересчет или проверка списков покупок по корзинам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только сравнить списки покупок с корзинами.'
+        )
+
+    def handle(self, **options):
+        if not options['verify']:
+            ShoppingListItem.objects.rebuild()
+            self.stdout.write(self.style.SUCCESS(
+                'Списки покупок пересчитаны.'
+            ))
+            return
+
+        live = {
+            (user_id, ingredient_id): total_amount
+            for user_id, ingredient_id, total_amount
+            in ShoppingListItem.objects.live()
+        }
+        stored = {
+            (user_id, ingredient_id): total_amount
+            for user_id, ingredient_id, total_amount
+            in ShoppingListItem.objects.values_list(
+                'user_id', 'ingredient_id', 'total_amount'
+            )
+        }
+        mismatched = {
+            key for key in live.keys() | stored.keys()
+            if live.get(key) != stored.get(key)
+        }
+        if mismatched:
+            users = sorted({user_id for user_id, _ in mismatched})
+            raise CommandError(
+                f'Расхождений: {len(mismatched)}, '
+                f'пользователи: {", ".join(map(str, users))}.'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            'Списки покупок совпадают с корзинами.'
+        ))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Q
+
+from recipes.db import count_subquery
+from recipes.models import Recipe
+from users.models import Subscription, User
+
+
+class Command(BaseCommand):
+    help = 'Сверка денормализованных счетчиков рецептов и авторов'
+
+    def handle(self, **kwargs):
+        with transaction.atomic():
+            sources = Recipe.objects.counter_sources()
+            drifted = Recipe.objects.annotate(
+                **{f'actual_{field}': source
+                   for field, source in sources.items()}
+            ).exclude(
+                Q(favorites_count=F('actual_favorites_count'))
+                & Q(in_carts_count=F('actual_in_carts_count'))
+            ).count()
+            Recipe.objects.recount_counters()
+
+            recipes_count = count_subquery(Recipe.objects.all(), 'author')
+            drifted_users = User.objects.annotate(
+                actual_recipes_count=recipes_count
+            ).exclude(recipes_count=F('actual_recipes_count')).count()
+            User.objects.update(recipes_count=recipes_count)
+
+            followers_count = count_subquery(
+                Subscription.objects.all(),
+                'author'
+            )
+            drifted_authors = User.objects.annotate(
+                actual_followers_count=followers_count
+            ).exclude(followers_count=F('actual_followers_count')).count()
+            User.objects.update(followers_count=followers_count)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено рецептов: {drifted}, авторов: {drifted_users}, '
+            f'подписчиков авторов: {drifted_authors}.'
+        ))
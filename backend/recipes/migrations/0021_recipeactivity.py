@@ -0,0 +1,60 @@
+# Generated by Django 2.2.16 on 2026-10-17 04:55
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_activities(apps, schema_editor):
+    # Уже добавленные рецепты учтены в счете популярности.
+    Favorite = apps.get_model('recipes', 'Favorite')
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    RecipeActivity = apps.get_model('recipes', 'RecipeActivity')
+    favorites = Favorite.objects.filter(
+        user__isnull=False,
+        recipe__isnull=False
+    ).values_list('user_id', 'recipe_id')
+    carts = ShoppingCart.recipe.through.objects.filter(
+        shoppingcart__user__isnull=False
+    ).values_list('shoppingcart__user_id', 'recipe_id')
+    for kind, rows in (('favorite', favorites), ('cart', carts)):
+        RecipeActivity.objects.bulk_create(
+            (
+                RecipeActivity(
+                    user_id=user_id,
+                    recipe_id=recipe_id,
+                    kind=kind
+                )
+                for user_id, recipe_id in rows.iterator()
+            ),
+            batch_size=1000
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0020_mediafile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeActivity',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('favorite', 'Избранное'), ('cart', 'Список покупок')], max_length=16, verbose_name='Действие')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='recipes.Recipe', verbose_name='Рецепт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Действие с рецептом',
+                'verbose_name_plural': 'Действия с рецептами',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='recipeactivity',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe', 'kind'), name='unique_recipe_activity'),
+        ),
+        migrations.RunPython(fill_activities, migrations.RunPython.noop),
+    ]
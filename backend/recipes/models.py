@@ -1,12 +1,74 @@
-from django.db import models
+import math
+import os
+import uuid
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connection, models, transaction
+from django.db.models import (
+    Case, Exists, F, IntegerField, OuterRef, Prefetch, Q, Subquery, Sum,
+    Value, When, Window,
+)
+from django.db.models.functions import (
+    Abs, Exp, Greatest, Ln, Lower, RowNumber,
+)
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
 
+from jobs.models import Job
+from .db import (
+    count_subquery, insert_ignoring_conflicts, insert_or_add, placeholders,
+)
 from .validators import validate_is_hex, validate_max_size_text
 
 
 User = get_user_model()
 
+# Точка отсчета времени для счета популярности рецептов.
+TRENDING_EPOCH = datetime(2022, 1, 1, tzinfo=timezone.utc)
+
+
+class IngredientQuerySet(models.QuerySet):
+    """
+    Queryset of :model:'recipes.Ingredient' with search by name.
+    """
+
+    # Триграммный индекс бесполезен для запросов короче трех символов.
+    trigram_min_length = 3
+
+    def search(self, name, limit):
+        """
+        To search ingredients by name on the database side.
+        On PostgreSQL exact and prefix matches are ranked ahead of
+        substring and trigram (typo) matches. Other databases
+        use plain 'startswith'.
+        """
+        name = name.lower()
+        if connection.vendor != 'postgresql':
+            return self.filter(name__startswith=name)[:limit]
+
+        # Условия на lower(name) используют индексы из миграции 0012.
+        queryset = self.annotate(name_lower=Lower('name'))
+        if len(name) < self.trigram_min_length:
+            return queryset.filter(
+                name_lower__startswith=name
+            ).order_by('name_lower')[:limit]
+        return queryset.filter(
+            Q(name_lower__contains=name)
+            | Q(name_lower__trigram_similar=name)
+        ).annotate(
+            rank=Case(
+                When(name_lower=name, then=Value(0)),
+                When(name_lower__startswith=name, then=Value(1)),
+                When(name_lower__contains=name, then=Value(2)),
+                default=Value(3),
+                output_field=IntegerField()
+            ),
+            similarity=TrigramSimilarity('name_lower', name),
+        ).order_by('rank', '-similarity', 'name_lower')[:limit]
+
 
 class Ingredient(models.Model):
     """
@@ -22,6 +84,8 @@ class Ingredient(models.Model):
         verbose_name='Единица измерения'
     )
 
+    objects = IngredientQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
@@ -58,6 +122,143 @@ class Tag(models.Model):
         return self.name
 
 
+def trending_age(moment):
+    """To get time from TRENDING_EPOCH to moment in decay periods."""
+    tau = settings.TRENDING_HALF_LIFE_HOURS * 3600 / math.log(2)
+    return (moment - TRENDING_EPOCH).total_seconds() / tau
+
+
+class RecipeQuerySet(models.QuerySet):
+    """
+    Queryset of :model:'recipes.Recipe' with user-dependent annotations
+    and prefetched relations used by serializers.
+    """
+
+    def with_related(self):
+        # Автор, ингредиенты с количеством и теги загружаются
+        # фиксированным числом запросов на всю страницу.
+        return self.select_related('author').prefetch_related(
+            Prefetch(
+                'amount',
+                queryset=IngredientAmountInRecipe.objects.select_related(
+                    'ingredient'
+                )
+            ),
+            'tags',
+        )
+
+    def latest_by_author(self, author_ids, limit):
+        # Последние limit рецептов каждого автора одним запросом:
+        # ROW_NUMBER() OVER (PARTITION BY author ORDER BY pub_date DESC).
+        # Django не фильтрует по оконным функциям, поэтому
+        # ранжированный запрос оборачивается во внешний SELECT.
+        ranked = self.filter(author__in=author_ids).annotate(
+            row_number=Window(
+                expression=RowNumber(),
+                partition_by=[F('author')],
+                order_by=[F('pub_date').desc(), F('id').desc()],
+            )
+        ).order_by()
+        sql, params = ranked.query.sql_with_params()
+        return self.model.objects.raw(
+            f'SELECT * FROM ({sql}) ranked '
+            f'WHERE ranked.row_number <= %s '
+            f'ORDER BY ranked.row_number',
+            (*params, limit)
+        )
+
+    def counter_sources(self):
+        # Источники денормализованных счетчиков рецепта.
+        return {
+            'favorites_count': count_subquery(
+                Favorite.objects.all(), 'recipe'
+            ),
+            'in_carts_count': count_subquery(
+                ShoppingCart.recipe.through.objects.all(), 'recipe'
+            ),
+        }
+
+    def shift_counter(self, field, recipe_ids, delta):
+        """
+        To shift counter 'field' by delta with F() if one recipe
+        changed, or to enqueue its recount for many recipes.
+        """
+        if not delta:
+            return
+        if len(recipe_ids) == 1:
+            self.filter(id__in=recipe_ids).update(
+                **{field: F(field) + delta}
+            )
+        else:
+            # Пересчет по многим рецептам выполняется вне запроса.
+            Job.objects.enqueue(
+                'recipes.tasks.recount_counters',
+                sorted(recipe_ids),
+                [field]
+            )
+
+    def recount_counters(self, fields=None):
+        """To recount counters of recipes from scratch."""
+        sources = self.counter_sources()
+        return self.update(**{
+            field: sources[field] for field in fields or sources
+        })
+
+    def record_activity(self, weight):
+        """
+        To add an event of 'weight' to exponentially time-decayed
+        trending score of recipes with a single UPDATE.
+        """
+        # Счет хранится как логарифм суммы весов событий, приведенных
+        # к TRENDING_EPOCH: log(sum(w * exp((t - epoch) / tau))).
+        # Затухание у всех рецептов общее, поэтому порядок по
+        # trending_score совпадает с порядком по текущему счету.
+        now = timezone.now()
+        event = Value(
+            math.log(weight) + trending_age(now),
+            output_field=models.FloatField()
+        )
+        return self.update(
+            trending_score=Case(
+                When(trending_score__isnull=True, then=event),
+                default=Greatest('trending_score', event) + Ln(
+                    Value(1.0) + Exp(-Abs(F('trending_score') - event))
+                ),
+                output_field=models.FloatField()
+            ),
+            trending_updated_at=now
+        )
+
+    def trending(self):
+        """
+        To order recipes by trending score, recently active only.
+        The query is a scan of the trending_score index.
+        """
+        return self.filter(
+            trending_score__isnull=False,
+            trending_updated_at__gte=timezone.now() - timedelta(
+                days=settings.TRENDING_WINDOW_DAYS
+            )
+        ).order_by('-trending_score')
+
+    def with_user_flags(self, user):
+        # Флаги is_favorited и is_in_shopping_cart считаются
+        # подзапросами Exists() в том же SELECT, что и рецепты.
+        if user.is_anonymous:
+            return self
+        return self.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(
+                    user=user,
+                    recipe=OuterRef('pk')
+                )
+            ),
+        )
+
+
 class Recipe(models.Model):
     """
     The model to save recipes.
@@ -77,6 +278,18 @@ class Recipe(models.Model):
         upload_to='recipes/images/',
         verbose_name='Загрузить фото'
     )
+    # Изображение, для которого созданы уменьшенные копии,
+    # и ширина его оригинала. См. recipes/renditions.py.
+    rendition_source = models.CharField(
+        max_length=100,
+        blank=True,
+        editable=False
+    )
+    image_width = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False
+    )
     name = models.TextField(
         validators=[validate_max_size_text],
         verbose_name='Название рецепта'
@@ -96,15 +309,54 @@ class Recipe(models.Model):
         null=True
     )
     pub_date = models.DateTimeField(auto_now_add=True)
+    # Денормализованные счетчики, поддерживаются через F().
+    favorites_count = models.IntegerField(
+        default=0,
+        db_index=True,
+        verbose_name='В избранном'
+    )
+    in_carts_count = models.IntegerField(
+        default=0,
+        verbose_name='В списках покупок'
+    )
+    trending_score = models.FloatField(
+        null=True,
+        blank=True,
+        db_index=True,
+        verbose_name='Популярность'
+    )
+    trending_updated_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Последняя активность'
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = [
+            # Для keyset-пагинации по (pub_date, id).
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx'
+            ),
+        ]
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
     def __str__(self):
         return f'{self.name}, автор {self.author}'
 
+    @property
+    def current_trending_score(self):
+        """Trending score decayed to the current moment."""
+        if self.trending_score is None:
+            return 0.0
+        return math.exp(
+            self.trending_score - trending_age(timezone.now())
+        )
+
 
 class IngredientAmountInRecipe(models.Model):
     """
@@ -141,6 +393,130 @@ class IngredientAmountInRecipe(models.Model):
         )
 
 
+class RecipeActivityQuerySet(models.QuerySet):
+    """
+    Queryset of :model:'recipes.RecipeActivity'.
+    """
+
+    def first_time(self, user, recipe_ids, kind):
+        """
+        To record that user has done 'kind' with recipes.
+        Returns ids of recipes, for which it is done the first time.
+        """
+        existing = set()
+        if len(recipe_ids) > 1:
+            existing = set(self.filter(
+                user=user,
+                kind=kind,
+                recipe_id__in=recipe_ids
+            ).values_list('recipe_id', flat=True))
+        added = insert_ignoring_conflicts(
+            self.model,
+            ('user_id', 'recipe_id', 'kind'),
+            f'SELECT %s, id, %s FROM {Recipe._meta.db_table} '
+            f'WHERE id IN ({placeholders(recipe_ids)})',
+            [user.id, kind, *recipe_ids]
+        )
+        if not added:
+            return []
+        return [
+            recipe_id for recipe_id in recipe_ids
+            if recipe_id not in existing
+        ]
+
+
+class RecipeActivity(models.Model):
+    """
+    Recipe added by a user to favorites or to the shopping cart at
+    least once. The trending score counts only the first addition,
+    so removing and adding a recipe again does not raise it.
+    """
+
+    FAVORITE = 'favorite'
+    CART = 'cart'
+    KINDS = (
+        (FAVORITE, 'Избранное'),
+        (CART, 'Список покупок'),
+    )
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Пользователь'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Рецепт'
+    )
+    kind = models.CharField(
+        max_length=16,
+        choices=KINDS,
+        verbose_name='Действие'
+    )
+
+    objects = RecipeActivityQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe', 'kind'],
+                name='unique_recipe_activity'
+            ),
+        ]
+        verbose_name = 'Действие с рецептом'
+        verbose_name_plural = 'Действия с рецептами'
+
+
+class FavoriteQuerySet(models.QuerySet):
+    """
+    Queryset of :model:'recipes.Favorite' with single-statement
+    idempotent add and remove.
+    """
+
+    def add(self, user, recipe_ids):
+        """To add existing recipes to favorites. Returns added count."""
+        if not recipe_ids:
+            return 0
+        with transaction.atomic():
+            existing = self.filter(
+                user=user,
+                recipe_id__in=recipe_ids
+            ).values_list('recipe_id', flat=True)
+            new_ids = recipe_ids
+            if len(recipe_ids) > 1:
+                new_ids = set(recipe_ids) - set(existing)
+            added = insert_ignoring_conflicts(
+                self.model,
+                ('user_id', 'recipe_id'),
+                f'SELECT %s, id FROM {Recipe._meta.db_table} '
+                f'WHERE id IN ({placeholders(recipe_ids)})',
+                [user.id, *recipe_ids]
+            )
+            Recipe.objects.shift_counter('favorites_count', recipe_ids, added)
+            if added:
+                Recipe.objects.filter(
+                    id__in=RecipeActivity.objects.first_time(
+                        user, list(new_ids), RecipeActivity.FAVORITE
+                    )
+                ).record_activity(settings.TRENDING_FAVORITE_WEIGHT)
+        return added
+
+    def remove(self, user, recipe_ids):
+        """To remove recipes from favorites. Returns removed count."""
+        with transaction.atomic():
+            removed = self.filter(
+                user=user,
+                recipe_id__in=recipe_ids
+            ).delete()[0]
+            Recipe.objects.shift_counter(
+                'favorites_count', recipe_ids, -removed
+            )
+        return removed
+
+
 class Favorite(models.Model):
     """
     To save specific relation between both instance of
@@ -163,6 +539,8 @@ class Favorite(models.Model):
         null=True
     )
 
+    objects = FavoriteQuerySet.as_manager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -177,6 +555,59 @@ class Favorite(models.Model):
         return f'У {self.user} рецепт {self.recipe} в избранном.'
 
 
+class ShoppingCartQuerySet(models.QuerySet):
+    """
+    Queryset of :model:'recipes.ShoppingCart' with single-statement
+    idempotent add and remove of recipes.
+    """
+
+    def add(self, user, recipe_ids):
+        """To add existing recipes to user's cart. Returns added count."""
+        if not recipe_ids:
+            return 0
+        with transaction.atomic():
+            # Корзина создается до вставки: повторная попытка после
+            # пустой вставки гонялась бы с параллельным добавлением.
+            self.get_or_create(user=user)
+            existing = self.model.recipe.through.objects.filter(
+                shoppingcart__user=user,
+                recipe_id__in=recipe_ids
+            ).values_list('recipe_id', flat=True)
+            new_ids = recipe_ids
+            if len(recipe_ids) > 1:
+                new_ids = set(recipe_ids) - set(existing)
+            added = insert_ignoring_conflicts(
+                self.model.recipe.through,
+                ('shoppingcart_id', 'recipe_id'),
+                f'SELECT cart.id, recipe.id '
+                f'FROM {self.model._meta.db_table} cart, '
+                f'{Recipe._meta.db_table} recipe '
+                f'WHERE cart.user_id = %s '
+                f'AND recipe.id IN ({placeholders(recipe_ids)})',
+                [user.id, *recipe_ids]
+            )
+            Recipe.objects.shift_counter('in_carts_count', recipe_ids, added)
+            if added:
+                Recipe.objects.filter(
+                    id__in=RecipeActivity.objects.first_time(
+                        user, list(new_ids), RecipeActivity.CART
+                    )
+                ).record_activity(settings.TRENDING_CART_WEIGHT)
+        return added
+
+    def remove(self, user, recipe_ids):
+        """To remove recipes from user's cart. Returns removed count."""
+        with transaction.atomic():
+            removed = self.model.recipe.through.objects.filter(
+                shoppingcart__user=user,
+                recipe_id__in=recipe_ids
+            ).delete()[0]
+            Recipe.objects.shift_counter(
+                'in_carts_count', recipe_ids, -removed
+            )
+        return removed
+
+
 class ShoppingCart(models.Model):
     """
     To manage shopping cart - an object to collect
@@ -195,6 +626,13 @@ class ShoppingCart(models.Model):
         related_name='recipes',
         verbose_name='Рецепты'
     )
+    # Увеличивается при каждом изменении содержимого списка покупок.
+    version = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Версия'
+    )
+
+    objects = ShoppingCartQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Список покупок'
@@ -202,3 +640,484 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'Список покупок {self.user}.'
+
+
+class ShoppingListItemQuerySet(models.QuerySet):
+    """
+    Queryset of :model:'recipes.ShoppingListItem' with methods
+    to maintain the aggregate incrementally. Every change bumps
+    'version' of :model:'recipes.ShoppingCart'.
+    """
+
+    def add_recipe(self, user, recipe):
+        """To add ingredients of the recipe to user's shopping list."""
+        self.apply_recipe(user, recipe, 1)
+
+    def remove_recipe(self, user, recipe):
+        """To subtract ingredients of the recipe from the shopping list."""
+        self.apply_recipe(user, recipe, -1)
+
+    def apply_recipe(self, user, recipe, sign):
+        # Одна инструкция на изменение: одновременные добавления
+        # рецептов с общим ингредиентом не создадут две строки.
+        amounts = IngredientAmountInRecipe.objects.filter(recipe=recipe)
+        with transaction.atomic():
+            if sign > 0:
+                insert_or_add(
+                    self.model,
+                    ('user_id', 'ingredient_id', 'total_amount'),
+                    ('user_id', 'ingredient_id'),
+                    'total_amount',
+                    f'SELECT %s, ingredient_id, SUM(amount) '
+                    f'FROM {IngredientAmountInRecipe._meta.db_table} '
+                    f'WHERE recipe_id = %s GROUP BY ingredient_id',
+                    [user.id, getattr(recipe, 'pk', recipe)]
+                )
+            else:
+                items = self.filter(
+                    user=user,
+                    ingredient_id__in=amounts.values('ingredient_id')
+                )
+                items.update(total_amount=F('total_amount') - Subquery(
+                    amounts.filter(
+                        ingredient_id=OuterRef('ingredient_id')
+                    ).values('ingredient_id').annotate(
+                        total=Sum('amount')
+                    ).values('total')
+                ))
+                items.filter(total_amount__lte=0).delete()
+            ShoppingCart.objects.filter(user=user).update(
+                version=F('version') + 1
+            )
+
+    def live(self, user_ids=None):
+        """
+        To aggregate shopping lists from carts from scratch.
+        Rows: (user_id, ingredient_id, total_amount).
+        """
+        # Условия на корзину передаются в один filter(), чтобы
+        # не получить второй JOIN по связи многие-ко-многим.
+        if user_ids is None:
+            conditions = {'recipe__recipes__user__isnull': False}
+        else:
+            conditions = {'recipe__recipes__user__in': user_ids}
+        return IngredientAmountInRecipe.objects.filter(
+            **conditions
+        ).values_list(
+            'recipe__recipes__user',
+            'ingredient_id',
+        ).annotate(
+            total=Sum('amount')
+        ).order_by()
+
+    def rebuild(self, user_ids=None):
+        """To recompute shopping lists of users (of all if None)."""
+        with transaction.atomic():
+            items = self.all()
+            if user_ids is not None:
+                items = items.filter(user__in=user_ids)
+            items.delete()
+            self.bulk_create(
+                self.model(
+                    user_id=user_id,
+                    ingredient_id=ingredient_id,
+                    total_amount=total_amount
+                )
+                for user_id, ingredient_id, total_amount
+                in self.live(user_ids)
+            )
+            carts = ShoppingCart.objects.all()
+            if user_ids is not None:
+                carts = carts.filter(user__in=user_ids)
+            carts.update(version=F('version') + 1)
+
+    def rebuild_for_recipe(self, recipe):
+        """To recompute shopping lists containing the recipe."""
+        self.rebuild(list(
+            ShoppingCart.objects.filter(
+                recipe=recipe
+            ).values_list('user_id', flat=True)
+        ))
+
+
+class ShoppingListItem(models.Model):
+    """
+    Materialized aggregate of :model:'recipes.ShoppingCart':
+    total amount of each ingredient in user's shopping list.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Ингредиент'
+    )
+    total_amount = models.IntegerField(verbose_name='Количество')
+
+    objects = ShoppingListItemQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient', ],
+                name='unique_shopping_list_item'
+            ),
+        ]
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Ингредиенты в списках покупок'
+
+    def __str__(self):
+        return (
+            f'{self.ingredient.name} в списке покупок {self.user}: '
+            f'{self.total_amount}.'
+        )
+
+
+def pull_authors(queryset):
+    """
+    To narrow down users to authors with more than
+    FEED_FANOUT_MAX_FOLLOWERS followers. Their recipes are not
+    fanned out to timelines, but merged into feeds on read.
+    """
+    return queryset.filter(
+        followers_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS
+    )
+
+
+class TimelineEntryQuerySet(models.QuerySet):
+    """
+    Queryset of :model:'recipes.TimelineEntry' with fan-out of new
+    recipes to followers and cursor reads of user's feed.
+    """
+
+    def fan_out(self, recipe):
+        """
+        To push a new recipe to timelines of author's followers
+        in batches of FEED_FANOUT_BATCH_SIZE.
+        Returns the number of timelines the recipe was pushed to.
+        """
+        if pull_authors(User.objects.filter(pk=recipe.author_id)).exists():
+            return 0
+        followers = User.objects.filter(
+            subscriber__author_id=recipe.author_id
+        ).order_by('id').values_list('id', flat=True)
+        pushed = 0
+        last_id = 0
+        while True:
+            batch = list(
+                followers.filter(id__gt=last_id)[
+                    :settings.FEED_FANOUT_BATCH_SIZE
+                ]
+            )
+            if not batch:
+                return pushed
+            self.bulk_create(
+                [
+                    self.model(
+                        user_id=user_id,
+                        recipe_id=recipe.id,
+                        author_id=recipe.author_id,
+                        pub_date=recipe.pub_date
+                    )
+                    for user_id in batch
+                ],
+                ignore_conflicts=True
+            )
+            pushed += len(batch)
+            last_id = batch[-1]
+
+    def follow(self, user, author_ids):
+        """
+        To put the latest FEED_BACKFILL_SIZE recipes of newly
+        followed authors to user's timeline.
+        """
+        author_ids = list(
+            User.objects.filter(
+                id__in=author_ids,
+                followers_count__lte=settings.FEED_FANOUT_MAX_FOLLOWERS
+            ).values_list('id', flat=True)
+        )
+        if not author_ids:
+            return
+        self.bulk_create(
+            [
+                self.model(
+                    user_id=user.id,
+                    recipe_id=recipe.id,
+                    author_id=recipe.author_id,
+                    pub_date=recipe.pub_date
+                )
+                for recipe in Recipe.objects.latest_by_author(
+                    author_ids,
+                    settings.FEED_BACKFILL_SIZE
+                )
+            ],
+            ignore_conflicts=True
+        )
+
+    def unfollow(self, user, author_ids):
+        """To drop recipes of unfollowed authors from user's timeline."""
+        return self.filter(user=user, author_id__in=author_ids).delete()[0]
+
+    def feed(self, user, limit, position=None):
+        """
+        To get ids of the next limit recipes of user's feed after
+        position (pub_date, id), newest first. Timeline entries are
+        merged with recipes of followed authors, which are not fanned
+        out. Each source is read by its own index range scan.
+        """
+        entries = self.filter(user=user)
+        pulled = Recipe.objects.filter(
+            author__in=pull_authors(
+                User.objects.filter(subscribing__user=user)
+            )
+        )
+        if position is not None:
+            pub_date, recipe_id = position
+            entries = entries.filter(
+                Q(pub_date__lt=pub_date)
+                | Q(pub_date=pub_date, recipe_id__lt=recipe_id)
+            )
+            pulled = pulled.filter(
+                Q(pub_date__lt=pub_date)
+                | Q(pub_date=pub_date, id__lt=recipe_id)
+            )
+        # Рецепт может быть и в ленте, и среди рецептов авторов,
+        # перешедших на чтение при запросе, поэтому строки - множество.
+        rows = set(
+            entries.order_by('-pub_date', '-recipe_id').values_list(
+                'pub_date', 'recipe_id'
+            )[:limit]
+        )
+        rows.update(
+            pulled.order_by('-pub_date', '-id').values_list(
+                'pub_date', 'id'
+            )[:limit]
+        )
+        return [
+            recipe_id for _, recipe_id in sorted(rows, reverse=True)[:limit]
+        ]
+
+
+class TimelineEntry(models.Model):
+    """
+    Recipe in the feed of :model:'users.User', pushed when
+    the recipe of a followed author is created.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Пользователь'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Рецепт'
+    )
+    # Автор и дата публикации копируются из рецепта, чтобы лента
+    # читалась и чистилась при отписке без JOIN.
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    objects = TimelineEntryQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe', ],
+                name='unique_timeline_entry'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-recipe'],
+                name='timeline_user_pub_date_idx'
+            ),
+        ]
+        verbose_name = 'Рецепт в ленте'
+        verbose_name_plural = 'Рецепты в лентах'
+
+    def __str__(self):
+        return f'{self.recipe} в ленте {self.user}.'
+
+
+class ImageUploadQuerySet(models.QuerySet):
+    """
+    Queryset of :model:'recipes.ImageUpload' with cleanup
+    of abandoned uploads.
+    """
+
+    def expired(self):
+        return self.filter(
+            created__lt=timezone.now() - timedelta(
+                hours=settings.CHUNKED_UPLOAD_EXPIRE_HOURS
+            )
+        )
+
+    def discard(self):
+        """To delete uploads with their files. Returns deleted count."""
+        uploads = list(self)
+        for upload in uploads:
+            upload.discard()
+        return len(uploads)
+
+
+class ImageUpload(models.Model):
+    """
+    Image uploaded by chunks, which can be resumed from the last
+    received byte. Completed upload is referenced by token
+    in 'image' field of :model:'recipes.Recipe' payload.
+    """
+
+    token = models.UUIDField(
+        default=uuid.uuid4,
+        unique=True,
+        editable=False,
+        verbose_name='Токен'
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='image_uploads',
+        verbose_name='Пользователь'
+    )
+    content_type = models.CharField(max_length=32, verbose_name='Тип')
+    size = models.PositiveIntegerField(verbose_name='Размер')
+    offset = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Получено байт'
+    )
+    created = models.DateTimeField(auto_now_add=True)
+
+    objects = ImageUploadQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Загрузка изображения'
+        verbose_name_plural = 'Загрузки изображений'
+
+    def __str__(self):
+        return f'Загрузка {self.token}: {self.offset} из {self.size} байт.'
+
+    @property
+    def path(self):
+        return os.path.join(settings.CHUNKED_UPLOAD_ROOT, self.token.hex)
+
+    @property
+    def completed(self):
+        return self.offset == self.size
+
+    def write(self, offset, stream, length):
+        """
+        To write length bytes from stream at offset and to move
+        the offset. Bytes after the offset, left by an interrupted
+        request, are overwritten.
+        """
+        os.makedirs(settings.CHUNKED_UPLOAD_ROOT, exist_ok=True)
+        mode = 'r+b' if os.path.exists(self.path) else 'w+b'
+        with open(self.path, mode) as file:
+            file.seek(offset)
+            remaining = length
+            while remaining:
+                chunk = stream.read(min(remaining, 64 * 1024))
+                if not chunk:
+                    break
+                file.write(chunk)
+                remaining -= len(chunk)
+            file.truncate()
+            self.offset = file.tell()
+        self.save(update_fields=['offset'])
+
+    def discard(self):
+        """To delete the upload with its file."""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        self.delete()
+
+
+class MediaFileQuerySet(models.QuerySet):
+    """
+    Queryset of :model:'recipes.MediaFile' with reference counting.
+    Both methods lock the row until the end of the transaction.
+    """
+
+    def acquire(self, name):
+        """To count a new reference to the stored file."""
+        insert_or_add(
+            self.model,
+            ('name', 'references'),
+            ('name',),
+            'references',
+            'VALUES (%s, 1)',
+            [name]
+        )
+
+    def release(self, name):
+        """
+        To drop a reference to the stored file.
+        Returns True if the file is not referenced anymore.
+        The row is kept until the file is deleted, see delete_unreferenced().
+        """
+        with transaction.atomic():
+            media = self.select_for_update().filter(name=name).first()
+            if media is None:
+                return False
+            self.filter(pk=media.pk).update(
+                references=F('references') - 1
+            )
+            return media.references <= 1
+
+    def delete_unreferenced(self, name, delete):
+        """
+        To call delete() and to drop the row if the file is still
+        not referenced. The row is locked meanwhile, so a concurrent
+        acquire() waits and then stores the file again.
+        """
+        with transaction.atomic():
+            media = self.select_for_update().filter(
+                name=name,
+                references__lte=0
+            ).first()
+            if media is None:
+                return False
+            delete()
+            media.delete()
+        return True
+
+
+class MediaFile(models.Model):
+    """
+    Number of references to a file of content-addressed storage,
+    see recipes/storage.py. The file is deleted with the last reference.
+    """
+
+    name = models.CharField(
+        max_length=100,
+        unique=True,
+        verbose_name='Файл'
+    )
+    references = models.IntegerField(default=0, verbose_name='Ссылок')
+
+    objects = MediaFileQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Медиафайл'
+        verbose_name_plural = 'Медиафайлы'
+
+    def __str__(self):
+        return f'{self.name}: {self.references}'
@@ -0,0 +1,132 @@
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from .models import MediaFile, Recipe
+
+
+# Ширины уменьшенных копий изображения рецепта.
+RENDITION_WIDTHS = (300, 600, 1200)
+
+# Форматы копий: расширение -> (формат Pillow, параметры сохранения).
+RENDITION_FORMATS = {
+    'jpg': ('JPEG', {'quality': 80, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', {'quality': 75, 'method': 4}),
+}
+
+
+def rendition_widths(image_width):
+    """
+    To get widths of renditions for an original of image_width.
+    Images are not upscaled: renditions wider than the original
+    are replaced by one of the original width.
+    """
+    widths = [width for width in RENDITION_WIDTHS if width < image_width]
+    if image_width <= RENDITION_WIDTHS[-1]:
+        widths.append(image_width)
+    return widths
+
+
+def rendition_name(name, width, extension):
+    """
+    To name a rendition next to the original:
+    'recipes/images/photo.png' -> 'recipes/images/photo_300w.webp'.
+    """
+    root, _ = os.path.splitext(name)
+    return f'{root}_{width}w.{extension}'
+
+
+def renditions(recipe, extension):
+    """
+    To get (width, name) pairs of recipe image renditions in format
+    of extension, narrowest first. Returns an empty list if renditions
+    of the current image are not made yet.
+    """
+    name = recipe.image.name
+    if not name or recipe.rendition_source != name:
+        return []
+    return [
+        (width, rendition_name(name, width, extension))
+        for width in rendition_widths(recipe.image_width)
+    ]
+
+
+def flatten(image):
+    """To convert image to RGB, transparent areas become white."""
+    if image.mode not in ('RGBA', 'LA', 'P'):
+        return image.convert('RGB')
+    image = image.convert('RGBA')
+    flat = Image.new('RGB', image.size, 'white')
+    flat.paste(image, mask=image.getchannel('A'))
+    return flat
+
+
+def create_renditions(recipe):
+    """
+    To make JPEG and WebP renditions of the recipe image, to store
+    them next to the original and to mark the recipe as rendered.
+    """
+    name = recipe.image.name
+    # Одинаковые изображения хранятся одним файлом, копии уже
+    # могли быть созданы для другого рецепта.
+    image_width = Recipe.objects.filter(
+        rendition_source=name
+    ).values_list('image_width', flat=True).first()
+    if image_width is None:
+        image_width = render(recipe.image.storage, name)
+
+    recipe.rendition_source = name
+    recipe.image_width = image_width
+    Recipe.objects.filter(pk=recipe.pk, image=name).update(
+        rendition_source=name,
+        image_width=image_width
+    )
+
+
+def render(storage, name):
+    """
+    To make renditions of image 'name' in storage.
+    Returns width of the original.
+    """
+    with storage.open(name) as file:
+        image = Image.open(file)
+        original_width = image.width
+        # JPEG декодируется сразу в уменьшенном масштабе.
+        image.draft('RGB', (RENDITION_WIDTHS[-1], RENDITION_WIDTHS[-1]))
+        scale = original_width / image.width
+        image = flatten(ImageOps.exif_transpose(image))
+    image_width = round(image.width * scale)
+
+    for width in rendition_widths(image_width):
+        resized = image
+        if width < image.width:
+            resized = image.resize(
+                (width, max(1, round(image.height * width / image.width))),
+                Image.LANCZOS
+            )
+        for extension, (pillow_format, options) in RENDITION_FORMATS.items():
+            buffer = BytesIO()
+            resized.save(buffer, pillow_format, **options)
+            storage.save_derived(
+                rendition_name(name, width, extension),
+                ContentFile(buffer.getvalue())
+            )
+    return image_width
+
+
+def delete_image(storage, name, image_width=None):
+    """
+    To delete the image with its renditions, unless it has been
+    referenced again. image_width is known if renditions were made.
+    """
+    def delete():
+        storage.delete(name)
+        if image_width is None:
+            return
+        for width in rendition_widths(image_width):
+            for extension in RENDITION_FORMATS:
+                storage.delete(rendition_name(name, width, extension))
+
+    MediaFile.objects.delete_unreferenced(name, delete)
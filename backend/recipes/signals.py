@@ -0,0 +1,106 @@
+"""
+Receivers, which keep images of :model:'recipes.Recipe' consistent:
+reference counts of :model:'recipes.MediaFile', deletion of unreferenced
+files and renditions of new images.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from jobs.models import Job
+from .models import MediaFile, Recipe
+from .renditions import delete_image
+
+
+def release_image(storage, name, image_width):
+    """To delete the image after commit with its last reference."""
+    if name and MediaFile.objects.release(name):
+        transaction.on_commit(
+            lambda: delete_image(storage, name, image_width)
+        )
+
+
+def image_changed(instance, created):
+    """To check if the save has set a new image of the recipe."""
+    replaced = getattr(instance, 'replaced_image', None)
+    return created or (
+        replaced is not None and replaced['image'] != instance.image.name
+    )
+
+
+@receiver(pre_save, sender=Recipe)
+def recipe_saving(sender, instance, update_fields=None, **kwargs):
+    """
+    To remember the image, which the recipe is about to replace,
+    and to count a reference to the new image before it is stored.
+    """
+    instance.replaced_image = None
+    instance.acquired_image = None
+    if instance.pk and (update_fields is None or 'image' in update_fields):
+        instance.replaced_image = Recipe.objects.filter(
+            pk=instance.pk
+        ).values('image', 'rendition_source', 'image_width').first()
+
+    # Ссылка учитывается до сохранения: хранилище не записывает файл,
+    # который уже есть, и удаление последней ссылкой в другом процессе
+    # не должно пройти между этой проверкой и подсчетом ссылки.
+    image = instance.image
+    if image and not image._committed and hasattr(
+        image.storage, 'hashed_name'
+    ):
+        instance.acquired_image = image.storage.hashed_name(
+            image.field.generate_filename(instance, image.name),
+            image.file
+        )
+        MediaFile.objects.acquire(instance.acquired_image)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_saved(sender, instance, created, **kwargs):
+    """To count references to the new image and to the replaced one."""
+    name = instance.image.name
+    acquired = getattr(instance, 'acquired_image', None)
+    replaced = getattr(instance, 'replaced_image', None)
+    if image_changed(instance, created):
+        if name and name != acquired:
+            MediaFile.objects.acquire(name)
+        if acquired and acquired != name:
+            release_image(instance.image.storage, acquired, None)
+        if replaced is not None:
+            rendered = replaced['rendition_source'] == replaced['image']
+            release_image(
+                instance.image.storage,
+                replaced['image'],
+                replaced['image_width'] if rendered else None
+            )
+    elif acquired:
+        # Загружено то же изображение, что уже было у рецепта.
+        release_image(instance.image.storage, acquired, None)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, created, **kwargs):
+    """To make renditions of a new recipe image after commit."""
+    # Сохранения без смены изображения не ставят задачу повторно,
+    # даже если копии еще не готовы.
+    if (
+        instance.image
+        and image_changed(instance, created)
+        and instance.rendition_source != instance.image.name
+    ):
+        Job.objects.enqueue(
+            'recipes.tasks.create_renditions',
+            instance.id,
+            instance.image.name
+        )
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_image_deleted(sender, instance, **kwargs):
+    """To release the image of a deleted recipe."""
+    rendered = instance.rendition_source == instance.image.name
+    release_image(
+        instance.image.storage,
+        instance.image.name,
+        instance.image_width if rendered else None
+    )
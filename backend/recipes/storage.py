@@ -0,0 +1,54 @@
+import hashlib
+import posixpath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage, which names files by SHA-256 of their content
+    and shards them into two levels of directories:
+    'recipes/images/photo.jpg' -> 'recipes/images/ab/cd/abcd...ef.jpg'.
+    Identical files are stored once, references to them are counted
+    by :model:'recipes.MediaFile'.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
+
+    def hashed_name(self, name, content):
+        # Хеш запоминается в файле: имя вычисляется еще до сохранения,
+        # чтобы учесть ссылку на файл, см. recipes/signals.py.
+        digest = getattr(content, 'sha256', None)
+        if digest is None:
+            digest = hashlib.sha256()
+            for chunk in content.chunks():
+                digest.update(chunk)
+            content.seek(0)
+            digest = content.sha256 = digest.hexdigest()
+        directory, filename = posixpath.split(name)
+        extension = posixpath.splitext(filename)[1].lower()
+        return posixpath.join(
+            directory,
+            digest[:2],
+            digest[2:4],
+            f'{digest}{extension}'
+        )
+
+    def save_derived(self, name, content):
+        """
+        To save a file derived from a stored one, e.g. a rendition,
+        under the exact name, replacing the existing file.
+        """
+        self.delete(name)
+        return super().save(name, content)
@@ -0,0 +1,27 @@
+"""
+Functions run by :model:'jobs.Job' workers. Arguments are
+JSON-serializable, objects are loaded by id when the job runs.
+"""
+from . import renditions
+from .models import Recipe, TimelineEntry
+
+
+def create_renditions(recipe_id, name):
+    """To make renditions of image 'name' of the recipe."""
+    recipe = Recipe.objects.filter(pk=recipe_id, image=name).first()
+    # Рецепт удален или изображение уже заменено.
+    if recipe is None or recipe.rendition_source == name:
+        return
+    renditions.create_renditions(recipe)
+
+
+def fan_out(recipe_id):
+    """To push a new recipe to timelines of author's followers."""
+    recipe = Recipe.objects.filter(pk=recipe_id).first()
+    if recipe is not None:
+        TimelineEntry.objects.fan_out(recipe)
+
+
+def recount_counters(recipe_ids, fields):
+    """To recount denormalized counters of recipes."""
+    Recipe.objects.filter(id__in=recipe_ids).recount_counters(fields)
@@ -0,0 +1,436 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from jobs.models import Job
+from users.models import User
+from .models import (
+    Favorite, Ingredient, IngredientAmountInRecipe, MediaFile, Recipe,
+    ShoppingCart, ShoppingListItem,
+)
+from .renditions import delete_image
+from .versions import bump_table_version, get_table_version
+
+
+def create_user(number):
+    return User.objects.create_user(
+        email=f'user{number}@example.com',
+        username=f'user{number}',
+        first_name='Имя',
+        last_name='Фамилия',
+        password='Strong-password-123'
+    )
+
+
+def create_recipe(author, amounts=(), image='recipes/images/recipe.png'):
+    """To create a recipe with {ingredient id: amount}."""
+    recipe = Recipe.objects.create(
+        author=author,
+        name='Рецепт',
+        text='Описание',
+        cooking_time=1,
+        image=image
+    )
+    IngredientAmountInRecipe.objects.bulk_create(
+        IngredientAmountInRecipe(
+            recipe=recipe,
+            ingredient_id=ingredient_id,
+            amount=amount
+        )
+        for ingredient_id, amount in dict(amounts).items()
+    )
+    return recipe
+
+
+class TableVersionTests(TransactionTestCase):
+
+    def test_bump_after_commit(self):
+        version = get_table_version(Ingredient)
+        with transaction.atomic():
+            Ingredient.objects.create(name='соль', measurement_unit='г')
+            self.assertEqual(get_table_version(Ingredient), version)
+        self.assertNotEqual(get_table_version(Ingredient), version)
+
+    def test_no_bump_on_rollback(self):
+        version = get_table_version(Ingredient)
+        try:
+            with transaction.atomic():
+                bump_table_version(Ingredient)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual(get_table_version(Ingredient), version)
+
+
+class ShoppingListItemTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(0)
+        cls.flour, cls.milk, cls.salt = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('мука', 'молоко', 'соль')
+        )
+        cls.pancakes = create_recipe(
+            cls.user,
+            {cls.flour.id: 200, cls.milk.id: 500}
+        )
+        cls.bread = create_recipe(
+            cls.user,
+            {cls.flour.id: 300, cls.salt.id: 5}
+        )
+
+    def shopping_list(self, user=None):
+        return dict(ShoppingListItem.objects.filter(
+            user=user or self.user
+        ).values_list('ingredient_id', 'total_amount'))
+
+    def live_list(self):
+        return {
+            ingredient_id: total
+            for _, ingredient_id, total
+            in ShoppingListItem.objects.live([self.user.id])
+        }
+
+    def cart(self, recipe, add=True):
+        if add:
+            ShoppingCart.objects.add(self.user, [recipe.id])
+            ShoppingListItem.objects.add_recipe(self.user, recipe)
+        else:
+            ShoppingCart.objects.remove(self.user, [recipe.id])
+            ShoppingListItem.objects.remove_recipe(self.user, recipe.id)
+
+    def test_add_recipes_with_shared_ingredient(self):
+        self.cart(self.pancakes)
+        self.cart(self.bread)
+        self.assertEqual(self.shopping_list(), {
+            self.flour.id: 500, self.milk.id: 500, self.salt.id: 5,
+        })
+        self.assertEqual(self.shopping_list(), self.live_list())
+
+    def test_remove_recipe(self):
+        self.cart(self.pancakes)
+        self.cart(self.bread)
+        self.cart(self.pancakes, add=False)
+        self.assertEqual(self.shopping_list(), {
+            self.flour.id: 300, self.salt.id: 5,
+        })
+        self.cart(self.bread, add=False)
+        self.assertEqual(self.shopping_list(), {})
+
+    def test_version_bumped(self):
+        self.cart(self.pancakes)
+        version = ShoppingCart.objects.get(user=self.user).version
+        self.cart(self.bread)
+        self.assertEqual(
+            ShoppingCart.objects.get(user=self.user).version,
+            version + 1
+        )
+
+    def test_rebuild_users_sharing_recipe(self):
+        second, third = create_user(1), create_user(2)
+        for user, recipes in (
+            (self.user, (self.pancakes, self.bread)),
+            (second, (self.pancakes,)),
+            (third, (self.bread,)),
+        ):
+            ShoppingCart.objects.add(user, [recipe.id for recipe in recipes])
+        expected = {
+            self.user: {
+                self.flour.id: 500, self.milk.id: 500, self.salt.id: 5,
+            },
+            second: {self.flour.id: 200, self.milk.id: 500},
+        }
+        ShoppingListItem.objects.rebuild([self.user.id, second.id])
+        for user, totals in expected.items():
+            self.assertEqual(self.shopping_list(user), totals)
+        self.assertEqual(self.shopping_list(third), {})
+
+        ShoppingListItem.objects.rebuild_for_recipe(self.bread)
+        expected[third] = {self.flour.id: 300, self.salt.id: 5}
+        for user, totals in expected.items():
+            self.assertEqual(self.shopping_list(user), totals)
+
+
+class TrendingScoreTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [create_user(number) for number in range(2)]
+        cls.recipes = [create_recipe(cls.users[0]) for _ in range(2)]
+
+    def score(self, recipe):
+        recipe.refresh_from_db()
+        return recipe.current_trending_score
+
+    def test_repeated_add_counted_once(self):
+        recipe = self.recipes[0]
+        for _ in range(3):
+            Favorite.objects.add(self.users[1], [recipe.id])
+            Favorite.objects.remove(self.users[1], [recipe.id])
+            ShoppingCart.objects.add(self.users[1], [recipe.id])
+            ShoppingCart.objects.remove(self.users[1], [recipe.id])
+        self.assertAlmostEqual(self.score(recipe), 2.0, places=3)
+
+    def test_bulk_add_counts_new_recipes(self):
+        Favorite.objects.add(self.users[0], [self.recipes[0].id])
+        Favorite.objects.remove(self.users[0], [self.recipes[0].id])
+        Favorite.objects.add(
+            self.users[0],
+            [recipe.id for recipe in self.recipes]
+        )
+        Favorite.objects.add(self.users[1], [self.recipes[0].id])
+        self.assertAlmostEqual(self.score(self.recipes[0]), 2.0, places=3)
+        self.assertAlmostEqual(self.score(self.recipes[1]), 1.0, places=3)
+
+
+@override_settings(JOBS_RUN_INLINE=False)
+class CounterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [create_user(number) for number in range(3)]
+        cls.recipes = [create_recipe(cls.users[0]) for _ in range(3)]
+        cls.ids = [recipe.id for recipe in cls.recipes]
+        Job.objects.all().delete()
+
+    def counters(self, field):
+        return list(Recipe.objects.order_by('id').values_list(
+            field, flat=True
+        ))
+
+    def recount_jobs(self):
+        return [
+            json.loads(args) for args in Job.objects.filter(
+                name='recipes.tasks.recount_counters'
+            ).values_list('args', flat=True)
+        ]
+
+    def test_single_change_shifts_counter(self):
+        Favorite.objects.add(self.users[1], self.ids[:1])
+        Favorite.objects.add(self.users[2], self.ids[:1])
+        ShoppingCart.objects.add(self.users[1], self.ids[1:2])
+        self.assertEqual(self.counters('favorites_count'), [2, 0, 0])
+        self.assertEqual(self.counters('in_carts_count'), [0, 1, 0])
+        Favorite.objects.remove(self.users[1], self.ids[:1])
+        ShoppingCart.objects.remove(self.users[1], self.ids[1:2])
+        self.assertEqual(self.counters('favorites_count'), [1, 0, 0])
+        self.assertEqual(self.counters('in_carts_count'), [0, 0, 0])
+        self.assertEqual(self.recount_jobs(), [])
+
+    def test_repeated_change_is_not_counted(self):
+        Favorite.objects.add(self.users[1], self.ids[:1])
+        Favorite.objects.add(self.users[1], self.ids[:1])
+        Favorite.objects.remove(self.users[2], self.ids[:1])
+        self.assertEqual(self.counters('favorites_count'), [1, 0, 0])
+
+    def test_bulk_change_enqueues_recount(self):
+        Favorite.objects.add(self.users[1], self.ids[::-1])
+        self.assertEqual(self.counters('favorites_count'), [0, 0, 0])
+        self.assertEqual(
+            self.recount_jobs(),
+            [[self.ids, ['favorites_count']]]
+        )
+        for job in Job.objects.claim(10, 60):
+            self.assertTrue(job.run())
+        self.assertEqual(self.counters('favorites_count'), [1, 1, 1])
+
+        Favorite.objects.remove(self.users[1], self.ids[:2])
+        Recipe.objects.filter(id__in=self.ids).recount_counters()
+        self.assertEqual(self.counters('favorites_count'), [0, 0, 1])
+
+    def test_recipe_count_of_author(self):
+        author = self.users[0]
+        create_recipe(author)
+        author.refresh_from_db()
+        self.assertEqual(author.recipes_count, 4)
+        self.recipes[0].delete()
+        author.refresh_from_db()
+        self.assertEqual(author.recipes_count, 3)
+
+    def test_reconcile_fixes_drift(self):
+        Favorite.objects.add(self.users[1], self.ids[:1])
+        ShoppingCart.objects.add(self.users[1], self.ids[:1])
+        Recipe.objects.filter(id=self.ids[1]).update(favorites_count=5)
+        Recipe.objects.filter(id=self.ids[0]).update(in_carts_count=0)
+        User.objects.filter(pk=self.users[0].pk).update(recipes_count=0)
+        output = io.StringIO()
+        call_command('reconcile_counters', stdout=output)
+        self.assertIn(
+            'Исправлено рецептов: 2, авторов: 1, подписчиков авторов: 0.',
+            output.getvalue()
+        )
+        self.assertEqual(self.counters('favorites_count'), [1, 0, 0])
+        self.assertEqual(self.counters('in_carts_count'), [1, 0, 0])
+        self.assertEqual(
+            User.objects.get(pk=self.users[0].pk).recipes_count,
+            3
+        )
+
+
+def image_file(color, size=(8, 8)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return ContentFile(buffer.getvalue(), name='photo.png')
+
+
+class MediaTestCase(TransactionTestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.settings_override = override_settings(MEDIA_ROOT=media_root)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.author = create_user(0)
+
+    def create(self, color):
+        recipe = create_recipe(self.author, image=image_file(color))
+        recipe.refresh_from_db()
+        return recipe
+
+
+@override_settings(JOBS_RUN_INLINE=False)
+class ContentAddressedStorageTests(MediaTestCase):
+
+    def references(self, name):
+        media = MediaFile.objects.filter(name=name).first()
+        return None if media is None else media.references
+
+    def test_identical_images_are_stored_once(self):
+        first = self.create('red')
+        second = self.create('red')
+        name = first.image.name
+        self.assertEqual(second.image.name, name)
+        directory, filename = os.path.split(name)
+        digest = os.path.splitext(filename)[0]
+        self.assertEqual(len(digest), 64)
+        self.assertEqual(
+            directory,
+            f'recipes/images/{digest[:2]}/{digest[2:4]}'
+        )
+        self.assertEqual(self.references(name), 2)
+
+        first.delete()
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(self.references(name), 1)
+        second.delete()
+        self.assertFalse(default_storage.exists(name))
+        self.assertIsNone(self.references(name))
+
+    def test_replaced_image_is_released(self):
+        recipe = self.create('red')
+        old = recipe.image.name
+        recipe.image = image_file('red')
+        recipe.save()
+        self.assertEqual(self.references(old), 1)
+
+        recipe.image = image_file('blue')
+        recipe.save()
+        self.assertFalse(default_storage.exists(old))
+        self.assertIsNone(self.references(old))
+        self.assertEqual(self.references(recipe.image.name), 1)
+
+    def test_acquire_before_deletion_keeps_file(self):
+        recipe = self.create('red')
+        name = recipe.image.name
+        with transaction.atomic():
+            self.assertTrue(MediaFile.objects.release(name))
+        # Новая ссылка появилась раньше, чем файл успели удалить.
+        MediaFile.objects.acquire(name)
+        delete_image(default_storage, name)
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(self.references(name), 1)
+
+    def test_upload_after_deletion_stores_file_again(self):
+        recipe = self.create('red')
+        name = recipe.image.name
+        Recipe.objects.filter(pk=recipe.pk).delete()
+        self.assertFalse(default_storage.exists(name))
+        self.assertEqual(self.create('red').image.name, name)
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(self.references(name), 1)
+
+
+@override_settings(JOBS_RUN_INLINE=False)
+class RenditionTests(MediaTestCase):
+
+    def jobs(self):
+        return list(Job.objects.filter(
+            name='recipes.tasks.create_renditions'
+        ).values_list('args', flat=True))
+
+    def run_jobs(self):
+        for job in Job.objects.claim(100, 60):
+            self.assertTrue(job.run())
+
+    def representation(self, recipe):
+        data = APIClient().get(f'/api/recipes/{recipe.id}/').json()
+        return data['image_thumb'], data['image_srcset']
+
+    def test_renditions_made_once_per_image(self):
+        recipe = create_recipe(self.author, image=image_file('red', (700, 2)))
+        self.assertEqual(len(self.jobs()), 1)
+        # Сохранения без смены изображения задачу не ставят.
+        recipe.name = 'Другое название'
+        recipe.save()
+        recipe.save(update_fields=['name'])
+        self.assertEqual(len(self.jobs()), 1)
+
+        self.run_jobs()
+        recipe.refresh_from_db()
+        name = recipe.image.name
+        self.assertEqual(recipe.rendition_source, name)
+        self.assertEqual(recipe.image_width, 700)
+        root = os.path.splitext(name)[0]
+        for width in (300, 600, 700):
+            for extension in ('jpg', 'webp'):
+                self.assertTrue(default_storage.exists(
+                    f'{root}_{width}w.{extension}'
+                ))
+        self.assertFalse(default_storage.exists(f'{root}_1200w.jpg'))
+
+        recipe.image = image_file('blue')
+        recipe.save()
+        self.assertEqual(len(self.jobs()), 2)
+
+    def test_identical_image_reuses_renditions(self):
+        first = create_recipe(self.author, image=image_file('red'))
+        self.run_jobs()
+        second = create_recipe(self.author, image=image_file('red'))
+        with mock.patch('recipes.renditions.render') as render:
+            self.run_jobs()
+        render.assert_not_called()
+        second.refresh_from_db()
+        self.assertEqual(second.rendition_source, first.image.name)
+        self.assertEqual(second.image_width, 8)
+
+    def test_thumb_and_srcset(self):
+        recipe = create_recipe(self.author, image=image_file('red', (700, 2)))
+        recipe.refresh_from_db()
+        thumb, srcset = self.representation(recipe)
+        self.assertTrue(thumb.endswith(recipe.image.url))
+        self.assertIsNone(srcset)
+
+        self.run_jobs()
+        root = os.path.splitext(recipe.image.url)[0]
+        thumb, srcset = self.representation(recipe)
+        self.assertEqual(thumb, f'http://testserver{root}_300w.jpg')
+        self.assertEqual(srcset, {
+            extension: ', '.join(
+                f'http://testserver{root}_{width}w.{extension} {width}w'
+                for width in (300, 600, 700)
+            )
+            for extension in ('jpg', 'webp')
+        })
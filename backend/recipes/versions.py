@@ -0,0 +1,35 @@
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+def table_version_key(model):
+    """Cache key of the version of the model table."""
+    return f'table_version:{model._meta.db_table}'
+
+
+def new_version():
+    return uuid.uuid4().hex
+
+
+def get_table_version(model):
+    """
+    To get the version of the model table. Caches and
+    indexes built from the table are valid while the version holds.
+    """
+    return cache.get_or_set(table_version_key(model), new_version, None)
+
+
+def bump_table_version(model):
+    """
+    To invalidate everything built from the model table after
+    the current transaction commits, so that nothing is rebuilt
+    from rows which are not visible yet.
+    """
+    # Версия не увеличивается, а заменяется новым случайным значением:
+    # incr у FileBasedCache - это get и set, и одновременные
+    # увеличения из разных процессов дали бы одно и то же значение.
+    transaction.on_commit(
+        lambda: cache.set(table_version_key(model), new_version(), None)
+    )
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-17 04:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_merge_20221130_2134'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='recipes_count',
+            field=models.IntegerField(default=0, verbose_name='Количество рецептов'),
+        ),
+    ]
@@ -1,11 +1,24 @@
 from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
+from django.db.models import F
+
+from recipes.db import count_subquery, insert_ignoring_conflicts, placeholders
 
 
 class User(AbstractUser):
     """Customize :model:'users.User'."""
 
     email = models.EmailField(unique=True)
+    # Денормализованный счетчик рецептов автора.
+    recipes_count = models.IntegerField(
+        default=0,
+        verbose_name='Количество рецептов'
+    )
+    # Денормализованный счетчик подписчиков автора.
+    followers_count = models.IntegerField(
+        default=0,
+        verbose_name='Количество подписчиков'
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name', ]
@@ -21,6 +34,55 @@ class User(AbstractUser):
         return f'{self.first_name} {self.last_name}'
 
 
+class SubscriptionQuerySet(models.QuerySet):
+    """
+    Queryset of :model:'users.Subscription' with single-statement
+    idempotent follow and unfollow.
+    """
+
+    def add(self, user, author_ids):
+        """
+        To subscribe user to existing authors, except user himself.
+        Returns the number of new subscriptions.
+        """
+        if not author_ids:
+            return 0
+        added = insert_ignoring_conflicts(
+            self.model,
+            ('user_id', 'author_id'),
+            f'SELECT %s, id FROM {User._meta.db_table} '
+            f'WHERE id IN ({placeholders(author_ids)}) AND id <> %s',
+            [user.id, *author_ids, user.id]
+        )
+        self.shift_followers(author_ids, added)
+        return added
+
+    def remove(self, user, author_ids):
+        """To unsubscribe user from authors. Returns removed count."""
+        removed = self.filter(
+            user=user,
+            author_id__in=author_ids
+        ).delete()[0]
+        self.shift_followers(author_ids, -removed)
+        return removed
+
+    def shift_followers(self, author_ids, delta):
+        """
+        To shift followers_count of one author by delta with F(),
+        or to recount it with a subquery for many authors.
+        """
+        if not delta:
+            return
+        authors = User.objects.filter(id__in=author_ids)
+        if len(author_ids) == 1:
+            authors.update(followers_count=F('followers_count') + delta)
+        else:
+            authors.update(followers_count=count_subquery(
+                self.model.objects.all(),
+                'author'
+            ))
+
+
 class Subscription(models.Model):
     """
     Store subsription, a relationship between
@@ -42,6 +104,8 @@ class Subscription(models.Model):
         verbose_name='Автор'
     )
 
+    objects = SubscriptionQuerySet.as_manager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(